@@ -1,13 +1,12 @@
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for
+from flask import Flask, Response, render_template, jsonify, request, session, redirect, url_for, make_response
 import asyncio
-from curl_cffi.requests import AsyncSession
-from scraper import PracujScraper
-from storage import AzureTableManager
+import json
+from response_format import COLUMNAR_MIMETYPE, encode_columnar, dumps_compact, compress_response
 import os
+import time
 from dotenv import load_dotenv
-from auth import AuthManager, create_password_hash # Importujemy nasz moduł
-import json
-import base64
+import hashlib
+import threading
 app = Flask(__name__)
 
 load_dotenv()
@@ -21,9 +20,73 @@ app.secret_key = os.getenv("FLASK_SECRET_KEY")
 if not app.secret_key:
     raise ValueError("Brak FLASK_SECRET_KEY w konfiguracji środowiskowej!")
 
+QUEUE_ENABLED = os.getenv("SCRAPE_QUEUE_ENABLED") == "1"
+
+
+# --- LENIWA INICJALIZACJA ---
+# Ciężkie biblioteki (curl_cffi, bs4, pandas, Azure SDK) i klienci Azure powstają przy
+# pierwszym użyciu albo w /warmup, a nie przy imporcie app.py - krótszy zimny start.
+def create_search_index():
+    from search_index import OfferSearchIndex
+    return OfferSearchIndex(os.getenv("SEARCH_INDEX_PATH", "search_index.db"))
+
+def create_storage_manager():
+    from storage import AzureTableManager
+    return AzureTableManager(AZURE_STORAGE_CONNECTION_STRING, search_index=get_service('search_index'))
+
+def create_history_cache():
+    from history_cache import HistoryPageCache
+    return HistoryPageCache(get_service('storage_manager'), results_per_page=100)
+
+def create_auth_manager():
+    from auth import AuthManager
+    return AuthManager(AZURE_STORAGE_CONNECTION_STRING)
+
+def create_queue_worker():
+    # Rozproszona kolejka zadań (wiele instancji App Service). Lokalnie: Azurite + SCRAPE_QUEUE_ENABLED=1
+    from scraper import PracujScraper
+    from task_queue import ScrapeTaskQueue, ScrapeWorker, SharedRateLimiter
+    return ScrapeWorker(
+        ScrapeTaskQueue(AZURE_STORAGE_CONNECTION_STRING),
+        SharedRateLimiter(AZURE_STORAGE_CONNECTION_STRING),
+        PracujScraper(),
+        get_service('storage_manager')
+    )
+
+SERVICE_FACTORIES = {
+    'search_index': create_search_index,
+    'storage_manager': create_storage_manager,
+    'history_cache': create_history_cache,
+    'auth_manager': create_auth_manager,
+    'queue_worker': create_queue_worker,
+}
+SERVICES = {}
+SERVICES_LOCK = threading.RLock() # RLock: fabryki wywołują get_service dla swoich zależności
+
+def get_service(name):
+    if name not in SERVICES:
+        with SERVICES_LOCK:
+            if name not in SERVICES:
+                SERVICES[name] = SERVICE_FACTORIES[name]()
+    return SERVICES[name]
+
+def run_background_worker():
+    from curl_cffi.requests import AsyncSession
+
+    async def worker_loop():
+        async with AsyncSession() as client:
+            await get_service('queue_worker').run_forever(client)
+    asyncio.run(worker_loop())
+
+# Worker w tle przejmuje zadania zleceń złożonych na innych instancjach
+# (inicjalizacja kolejki odbywa się już w jego wątku, poza ścieżką startu aplikacji)
+if QUEUE_ENABLED and os.getenv("SCRAPE_BACKGROUND_WORKER", "1") == "1":
+    threading.Thread(target=run_background_worker, daemon=True).start()
 
-storage_manager = AzureTableManager(AZURE_STORAGE_CONNECTION_STRING)
-auth_manager = AuthManager(AZURE_STORAGE_CONNECTION_STRING)
+@app.after_request
+def compress(response):
+    # Kompresja gzip dla większych odpowiedzi (JSON z /scrape, strony historii)
+    return compress_response(response, request.headers.get('Accept-Encoding'))
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -31,7 +94,7 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
         
-        user = auth_manager.verify_user(email, password)
+        user = get_service('auth_manager').verify_user(email, password)
         if user:
             session['user'] = user # Zapisujemy dane użytkownika w sesji
             return redirect(url_for('index'))
@@ -63,87 +126,203 @@ async def scrape():
     user_group = session['user']['group'] # Domyślnie HR
     user_email = session['user']['email']
     
-    scraper = PracujScraper()
-    all_results = []
-    
-    async with AsyncSession() as client:
-        tasks = [scraper.scrape_keyword(client, kw) for kw in keywords]
-        results = await asyncio.gather(*tasks)
-        for r in results:
-            all_results.extend(r)
-    
-    # Zapis do bazy danych Azure
-    try:
-        storage_manager.save_offers(all_results, user_group, user_email)
-    except Exception as e:
-        print(f"Błąd zapisu do Azure Table Storage: {e}")
+    from curl_cffi.requests import AsyncSession
+    storage_manager = get_service('storage_manager')
+    history_cache = get_service('history_cache')
+
+    if QUEUE_ENABLED:
+        # Tryb wieloinstancyjny: zadania trafiają do wspólnej kolejki, a ta instancja
+        # pomaga je wykonać (pozostałe zadania dzierżawią inne instancje)
+        queue_worker = get_service('queue_worker')
+        job_id = await asyncio.to_thread(queue_worker.queue.enqueue_job, keywords, user_group, user_email)
+        async with AsyncSession() as client:
+            status = await queue_worker.run_job(client, job_id)
+        all_results = await asyncio.to_thread(queue_worker.queue.job_results, job_id)
+        await asyncio.to_thread(queue_worker.queue.delete_job, job_id)
+        failed_keywords = status['errors']
+        # Workery zapisują oferty do Azure od razu po pobraniu strony
+        history_cache.invalidate(user_group)
+    else:
+        from scraper import PracujScraper
+        from write_pipeline import OfferWritePipeline
+        scraper = PracujScraper()
+        all_results = []
+        
+        # Zapis do bazy danych Azure równolegle ze scrapowaniem (każda strona trafia do kolejki zapisu)
+        async with AsyncSession() as client, OfferWritePipeline(storage_manager, user_group, user_email) as pipeline:
+            tasks = [
+                scraper.scrape_keyword(client, kw, sink=pipeline.put, group=user_group, user=user_email)
+                for kw in keywords
+            ]
+            results = await asyncio.gather(*tasks)
+            for r in results:
+                all_results.extend(r['results'])
+
+        # Frazy, których nie udało się pobrać (np. blokada, otwarty bezpiecznik) - przekazujemy je do frontendu
+        failed_keywords = [
+            {'keyword': r['keyword'], 'error': r['errors'][-1]['error']}
+            for r in results if r['errors']
+        ]
+        if pipeline.saved:
+            history_cache.invalidate(user_group)
 
     # Mapowanie na polskie nazwy dla frontendu (zgodnie z Twoim poprzednim wymogiem)
     formatted_results = []
     for o in all_results:
         formatted_results.append({
-            'Szukana fraza': o['Keyword'],
-            'Stanowisko': o['Title'],
-            'Firma': o['Company'],
-            'Wynagrodzenie': o['Salary'],
-            'Lokalizacja': o['Location'],
+            # .get: wyniki z kolejki nie zawierają pól, które były puste (Azure nie zapisuje None)
+            'Szukana fraza': o.get('Keyword'),
+            'Stanowisko': o.get('Title'),
+            'Firma': o.get('Company'),
+            'Wynagrodzenie': o.get('Salary'),
+            'Lokalizacja': o.get('Location'),
             'Link': o['Link'],
-            'Wymagania (AI)': o['Requirements']
+            'Wymagania (AI)': o.get('Requirements')
         })
 
     # Usuwanie duplikatów przed wysłaniem na frontend
-    unique_results = {o['Link']: o for o in formatted_results}.values()
-    return jsonify(list(unique_results))
-
-def encode_token(token):
-    """Zmienia słownik Azure na bezpieczny ciąg znaków Base64."""
-    if not token:
-        return None
-    # Azure token to zazwyczaj słownik, zamieniamy go na JSON, potem na bajty
-    token_json = json.dumps(token)
-    return base64.urlsafe_b64encode(token_json.encode()).decode()
-
-def decode_token(encoded_str):
-    """Zmienia ciąg Base64 z powrotem na słownik dla Azure."""
-    if not encoded_str:
-        return None
-    try:
-        # Dekodujemy z formatu bezpiecznego dla URL
-        decoded_bytes = base64.urlsafe_b64decode(encoded_str.encode())
-        return json.loads(decoded_bytes.decode())
-    except Exception as e:
-        print(f"Błąd dekodowania tokena: {e}")
-        return None
+    unique_results = list({o['Link']: o for o in formatted_results}.values())
+
+    # Format kolumnowy (nagłówek kolumn + słowniki powtarzających się wartości), jeśli frontend go obsługuje
+    if request.accept_mimetypes.best_match(['application/json', COLUMNAR_MIMETYPE]) == COLUMNAR_MIMETYPE:
+        columns = list(unique_results[0].keys()) if unique_results else []
+        payload = encode_columnar(unique_results, columns)
+        payload['errors'] = failed_keywords
+        return Response(dumps_compact(payload), mimetype=COLUMNAR_MIMETYPE)
+
+    # Zwykły JSON zostaje listą (zgodność z dotychczasowymi klientami) - nieudane frazy w nagłówku
+    response = jsonify(unique_results)
+    if failed_keywords:
+        response.headers['X-Failed-Keywords'] = json.dumps(failed_keywords) # ensure_ascii: nagłówek tylko ASCII
+    return response
+
+@app.route('/scrape/queue')
+def scrape_queue():
+    if 'user' not in session:
+        return jsonify({"error": "Brak autoryzacji"}), 401
+
+    # Obciążenie harmonogramu: wszystkie działy zbiorczo, własny dział z podziałem na użytkowników
+    from fair_scheduler import SCRAPE_SCHEDULER
+    return jsonify(SCRAPE_SCHEDULER.snapshot(group=session['user']['group']))
 
 @app.route('/history')
 def history():
     if 'user' not in session:
         return redirect(url_for('login'))
     
-    # 1. Pobieramy zakodowany (bezpieczny) string z adresu URL
-    raw_token = request.args.get('token')
-    
-    # 2. Dekodujemy go na słownik, który rozumie biblioteka Azure
-    azure_token = decode_token(raw_token)
-    
+    # 1. Numer strony i opcjonalny filtr frazy z adresu URL
+    page = request.args.get('page', 1, type=int)
+    keyword = request.args.get('keyword', '').strip() or None
     group = session['user']['group']
     
-    # 3. Pobieramy dane z bazy używając zdekodowanego tokena
-    result = storage_manager.get_offers_paginated(
-        group, 
-        results_per_page=100, 
-        offset_token=azure_token
-    )
+    # 2. Strona z cache serwera (tokeny kontynuacji Azure zostają po stronie serwera)
+    result = get_service('history_cache').get_page(group, page, keyword=keyword)
     
-    # 4. NOWY token z Azure znów kodujemy w Base64 przed wysłaniem do guzika "Następne"
-    safe_next_token = encode_token(result['next_token'])
+    # 3. ETag zależy też od użytkownika, bo strona zawiera jego dane w nawigacji
+    etag = hashlib.md5(f"{result['etag']}|{session['user']['email']}".encode()).hexdigest()
+    if request.if_none_match.contains_weak(etag) or (
+        not request.if_none_match and request.if_modified_since
+        and request.if_modified_since >= result['last_modified'].replace(microsecond=0)
+    ):
+        response = make_response('', 304)
+    else:
+        response = make_response(render_template(
+            'history.html', 
+            offers=result['offers'], 
+            page=result['page'],
+            has_prev=result['has_prev'],
+            has_next=result['has_next'],
+            known_pages=result['known_pages'],
+            keyword=keyword,
+            user=session['user']
+        ))
     
-    return render_template(
-        'history.html', 
-        offers=result['offers'], 
-        next_token=safe_next_token,
-        user=session['user']
+    # 4. Przeglądarka zawsze pyta serwer, ale przy braku zmian dostaje 304 bez treści
+    response.set_etag(etag)
+    response.last_modified = result['last_modified']
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/analytics/salaries')
+def salary_analytics():
+    if 'user' not in session:
+        return jsonify({"error": "Brak autoryzacji"}), 401
+
+    group = session['user']['group']
+    currency = request.args.get('currency', 'PLN')
+    basis = request.args.get('basis') # 'gross' / 'net' / brak = wszystkie
+
+    from salary import salary_percentiles
+
+    # Pobieramy tylko kolumny potrzebne do analizy (cała historia działu)
+    offers = get_service('storage_manager').get_all_offers(
+        group,
+        select=['PartitionKey', 'Salary', 'Location', 'PositionLevel']
     )
+    report = salary_percentiles(offers, currency=currency, basis=basis)
+
+    return jsonify({
+        dimension: stats.reset_index().to_dict('records')
+        for dimension, stats in report.items()
+    })
+
+@app.route('/search')
+def search():
+    if 'user' not in session:
+        return jsonify({"error": "Brak autoryzacji"}), 401
+
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 50, type=int), 200)
+
+    # Indeks jest lokalny dla instancji - dociągamy oferty zapisane gdzie indziej (pierwszy raz: cała historia)
+    search_index = get_service('search_index')
+    try:
+        search_index.sync_from_storage(get_service('storage_manager'), session['user']['group'])
+    except Exception as e:
+        # Azure niedostępne - szukamy w tym, co już jest w indeksie
+        print(f"Błąd synchronizacji indeksu wyszukiwania: {e}")
+
+    # Wyszukiwanie tylko w ofertach działu zalogowanego użytkownika
+    results = search_index.search(query, session['user']['group'], limit=limit)
+    return jsonify(results)
+
+@app.route('/healthz')
+def healthz():
+    # Liveness: bez zapytań do Azure, odpowiada natychmiast także przy zimnym starcie
+    from payload_schema import drift_report
+
+    # schema_drift: niezgodności payloadów Pracuj.pl ze schematem (sygnał, że parsery wymagają zmian)
+    return jsonify({"status": "ok", "initialized": sorted(SERVICES), "schema_drift": drift_report()})
+
+@app.route('/warmup')
+def warmup():
+    """
+    Rozgrzewa instancję przed ruchem użytkowników (na App Service: WEBSITE_WARMUP_PATH=/warmup).
+    Importuje moduły scrapera, tworzy klientów i otwiera połączenia z Azure Table Storage.
+    """
+    timings = {}
+
+    def timed(name, action):
+        start = time.perf_counter()
+        action()
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    # Moduły importowane leniwie przez /scrape i /analytics
+    timed('import_scraper', lambda: __import__('scraper'))
+    timed('import_salary', lambda: __import__('salary'))
+    for name in SERVICE_FACTORIES:
+        if name != 'queue_worker' or QUEUE_ENABLED:
+            timed(name, lambda: get_service(name))
+
+    # Połączenia TCP/TLS trafiają do puli klientów Azure i są używane przez kolejne zapytania
+    errors = {}
+    for name in ('storage_manager', 'auth_manager'):
+        try:
+            timed(f'{name}_connection', get_service(name).warm_up)
+        except Exception as e:
+            errors[name] = str(e)
+
+    return jsonify({"status": "ok" if not errors else "degraded", "timings_ms": timings, "errors": errors}), 200 if not errors else 503
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
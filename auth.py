@@ -6,6 +6,10 @@ class AuthManager:
     def __init__(self, connection_string):
         self.client = TableClient.from_connection_string(connection_string, table_name="Users")
 
+    def warm_up(self):
+        # Otwiera połączenie z tabelą Users przed pierwszym logowaniem
+        next(iter(self.client.query_entities("PartitionKey eq 'Segula'", select=["RowKey"], results_per_page=1)), None)
+
     def verify_user(self, email, password):
         try:
             # Szukamy użytkownika po adresie email (RowKey)
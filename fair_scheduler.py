@@ -0,0 +1,204 @@
+import os
+import time
+import asyncio
+import itertools
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+
+# --- KONFIGURACJA HARMONOGRAMU ---
+SCRAPE_CAPACITY = int(os.getenv("SCRAPE_CAPACITY", "2")) # Łączny limit jednoczesnych pobrań fraz (cały proces)
+DEFAULT_GROUP = "default"
+
+
+def parse_group_settings(value, cast=float):
+    """"HR=2,Sales=1" -> {"HR": 2.0, "Sales": 1.0} (zmienne środowiskowe wag i limitów działów)."""
+    settings = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            group, number = item.split("=", 1)
+            settings[group.strip()] = cast(number)
+    return settings
+
+
+class _Waiter:
+    __slots__ = ("group", "user", "loop", "future", "order", "enqueued_at", "granted")
+
+    def __init__(self, group, user, loop, future, order):
+        self.group = group
+        self.user = user
+        self.loop = loop
+        self.future = future
+        self.order = order
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class FairScheduler:
+    """
+    Sprawiedliwy przydział miejsc na pobieranie fraz: najpierw między działami, potem między użytkownikami.
+
+    Każdy dział i każdy użytkownik ma swój "czas wirtualny" rosnący o 1/waga z każdą
+    przydzieloną frazą. Wolne miejsce dostaje dział z najmniejszym czasem, a w nim
+    użytkownik z najmniejszym czasem (w kolejności zgłoszeń jego fraz). Dział lub
+    użytkownik, który wraca po przerwie, startuje od czasu aktualnie czekających,
+    więc nie "odbija sobie" bezczynności. Dzięki temu ktoś z jedną frazą nie czeka
+    na 20 fraz innej osoby, a działy z kwotą nie zajmą więcej niż quota miejsc.
+
+    Działa ponad pętlami zdarzeń (Flask ma osobną pętlę na każde żądanie):
+    stan chroni threading.Lock, a czekający są budzeni przez call_soon_threadsafe.
+    """
+
+    def __init__(self, capacity=SCRAPE_CAPACITY, group_weights=None, group_quotas=None):
+        self.capacity = capacity
+        self.group_weights = group_weights or {}
+        self.group_quotas = group_quotas or {}
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        self.in_use = 0
+        self.running = {}         # { dział: liczba pobierających fraz }
+        self.waiting = {}         # { dział: { użytkownik: deque[_Waiter] } }
+        self.group_vtime = {}     # { dział: czas wirtualny }
+        self.user_vtime = {}      # { (dział, użytkownik): czas wirtualny }
+
+    @classmethod
+    def from_env(cls):
+        """SCRAPE_GROUP_WEIGHTS="HR=2,Sales=1", SCRAPE_GROUP_QUOTAS="Sales=1" (maks. jednoczesnych fraz działu)."""
+        return cls(
+            group_weights=parse_group_settings(os.getenv("SCRAPE_GROUP_WEIGHTS")),
+            group_quotas=parse_group_settings(os.getenv("SCRAPE_GROUP_QUOTAS"), int),
+        )
+
+    def weight(self, group):
+        return self.group_weights.get(group, 1.0)
+
+    def quota(self, group):
+        return self.group_quotas.get(group, self.capacity)
+
+    @asynccontextmanager
+    async def slot(self, group=None, user=None):
+        """Miejsce na pobranie jednej frazy: `async with scheduler.slot(group, user): ...`"""
+        group = group or DEFAULT_GROUP
+        await self.acquire(group, user)
+        try:
+            yield
+        finally:
+            self.release(group)
+
+    async def acquire(self, group, user):
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(group, user, loop, loop.create_future(), next(self._order))
+        with self._lock:
+            self._enqueue(waiter)
+            self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    # Miejsce przydzielone tuż przed anulowaniem - oddajemy je
+                    self._release_locked(group)
+                else:
+                    self._remove(waiter)
+            raise
+
+    def release(self, group):
+        with self._lock:
+            self._release_locked(group)
+
+    def _release_locked(self, group):
+        self.in_use -= 1
+        self.running[group] -= 1
+        self._dispatch()
+
+    def _enqueue(self, waiter):
+        users = self.waiting.setdefault(waiter.group, {})
+        if len(users) == 0 and not self.running.get(waiter.group):
+            # Dział wraca do kolejki - bez nadrabiania czasu bezczynności
+            self.group_vtime[waiter.group] = max(self.group_vtime.get(waiter.group, 0.0), self._min_vtime(self.group_vtime, self.waiting))
+        if waiter.user not in users:
+            key = (waiter.group, waiter.user)
+            active = [self.user_vtime.get((waiter.group, u), 0.0) for u in users]
+            self.user_vtime[key] = max(self.user_vtime.get(key, 0.0), min(active, default=0.0))
+            users[waiter.user] = deque()
+        users[waiter.user].append(waiter)
+
+    def _remove(self, waiter):
+        users = self.waiting.get(waiter.group, {})
+        queue = users.get(waiter.user)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del users[waiter.user]
+        if not users:
+            self.waiting.pop(waiter.group, None)
+
+    @staticmethod
+    def _min_vtime(vtimes, waiting):
+        return min((vtimes.get(group, 0.0) for group in waiting if waiting[group]), default=0.0)
+
+    def _next_waiter(self):
+        candidates = [
+            group for group, users in self.waiting.items()
+            if users and self.running.get(group, 0) < self.quota(group)
+        ]
+        if not candidates:
+            return None
+        # Najmniejszy czas wirtualny; remis -> najstarsze zgłoszenie
+        oldest = lambda queue: queue[0].order
+        group = min(candidates, key=lambda g: (self.group_vtime.get(g, 0.0), min(oldest(q) for q in self.waiting[g].values())))
+        users = self.waiting[group]
+        user = min(users, key=lambda u: (self.user_vtime.get((group, u), 0.0), oldest(users[u])))
+        return users[user][0]
+
+    def _dispatch(self):
+        while self.in_use < self.capacity:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._remove(waiter)
+            self.in_use += 1
+            self.running[waiter.group] = self.running.get(waiter.group, 0) + 1
+            self.group_vtime[waiter.group] = self.group_vtime.get(waiter.group, 0.0) + 1.0 / self.weight(waiter.group)
+            key = (waiter.group, waiter.user)
+            self.user_vtime[key] = self.user_vtime.get(key, 0.0) + 1.0
+            waiter.granted = True
+            try:
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+            except RuntimeError:
+                # Pętla żądania już zamknięta (klient się rozłączył) - miejsce wraca do puli
+                waiter.granted = False
+                self.in_use -= 1
+                self.running[waiter.group] -= 1
+
+    def snapshot(self, group=None):
+        """
+        Stan kolejki: obciążenie, a dla działów - liczba czekających i pobierających fraz.
+
+        group: jeśli podany, tylko ten dział ma rozbicie na użytkowników (pozostałe bez adresów e-mail).
+        """
+        now = time.monotonic()
+        with self._lock:
+            groups = {}
+            for name in set(self.waiting) | {g for g, count in self.running.items() if count}:
+                users = self.waiting.get(name, {})
+                waiters = [w for queue in users.values() for w in queue]
+                groups[name] = {
+                    "running": self.running.get(name, 0),
+                    "waiting": len(waiters),
+                    "oldest_wait_s": round(max((now - w.enqueued_at for w in waiters), default=0.0), 1),
+                    "weight": self.weight(name),
+                    "quota": self.quota(name),
+                }
+                if name == group:
+                    groups[name]["users"] = {user: len(queue) for user, queue in users.items()}
+            return {"capacity": self.capacity, "in_use": self.in_use, "groups": groups}
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# Wspólny harmonogram dla wszystkich żądań /scrape w procesie
+SCRAPE_SCHEDULER = FairScheduler.from_env()
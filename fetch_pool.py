@@ -0,0 +1,127 @@
+import os
+import time
+import random
+import itertools
+
+# --- KONFIGURACJA PULI ---
+# Profile odcisku przeglądarki (TLS/HTTP2 + zgodne nagłówki) obsługiwane przez curl_cffi
+DEFAULT_PROFILES = ["chrome124", "chrome120", "chrome116", "edge101", "safari17_0"]
+# Nagłówki wysyłane niezależnie od profilu (User-Agent i Sec-* ustawia impersonate,
+# żeby zgadzały się z odciskiem TLS danego profilu)
+PROFILE_HEADERS = {
+    "Accept-Language": "pl-PL,pl;q=0.9,en-US;q=0.8,en;q=0.7",
+}
+BLOCK_STATUSES = {403, 429} # Kody oznaczające blokadę danego odcisku / adresu IP
+HEALTH_DECAY = 0.3          # Waga ostatniego wyniku w średniej kroczącej zdrowia
+LATENCY_REFERENCE = 2.0     # Opóźnienie (s), przy którym wynik zdrowia spada o połowę
+COOLDOWN_BASE = 30          # Pierwsza kwarantanna (s), podwajana przy kolejnych blokadach
+COOLDOWN_MAX = 15 * 60
+
+
+class PoolMember:
+    """Para (profil, proxy) wraz ze statystykami ostatnich zapytań."""
+
+    def __init__(self, profile, proxy=None):
+        self.profile = profile
+        self.proxy = proxy
+        self.success_rate = 1.0
+        self.latency = 0.0
+        self.consecutive_blocks = 0
+        self.quarantined_until = 0.0
+        self.requests = 0
+
+    @property
+    def score(self):
+        return self.success_rate / (1 + self.latency / LATENCY_REFERENCE)
+
+    def is_available(self, now):
+        return now >= self.quarantined_until
+
+    def __repr__(self):
+        return f"<PoolMember {self.profile} via {self.proxy or 'direct'} score={self.score:.2f}>"
+
+
+class FetchPool:
+    """
+    Pula profili odcisku i opcjonalnych proxy wyjściowych.
+
+    Każde zapytanie idzie przez najzdrowszego dostępnego członka puli.
+    Członek, który dostał 403/429, trafia na kwarantannę z rosnącym czasem
+    schłodzenia, a po jej upływie wraca z obniżonym wynikiem.
+    """
+
+    def __init__(self, profiles=None, proxies=None, clock=time.monotonic):
+        self.clock = clock
+        self.members = [
+            PoolMember(profile, proxy)
+            for profile, proxy in itertools.product(profiles or DEFAULT_PROFILES, proxies or [None])
+        ]
+
+    @classmethod
+    def from_env(cls):
+        """Konfiguracja z SCRAPER_PROFILES i SCRAPER_PROXIES (listy rozdzielone przecinkami)."""
+        profiles = [p.strip() for p in os.getenv("SCRAPER_PROFILES", "").split(",") if p.strip()]
+        proxies = [p.strip() for p in os.getenv("SCRAPER_PROXIES", "").split(",") if p.strip()]
+        return cls(profiles or None, proxies or None)
+
+    def pick(self):
+        """Wybiera najzdrowszego dostępnego członka (remisy rozstrzygane losowo)."""
+        now = self.clock()
+        available = [m for m in self.members if m.is_available(now)]
+        if not available:
+            # Wszyscy na kwarantannie - bierzemy tego, który najszybciej z niej wyjdzie
+            return min(self.members, key=lambda m: m.quarantined_until)
+        best = max(m.score for m in available)
+        return random.choice([m for m in available if m.score >= best * 0.95])
+
+    def cooldown_remaining(self):
+        """Ile sekund zostało do zwolnienia pierwszego członka z kwarantanny (0 = ktoś jest dostępny)."""
+        now = self.clock()
+        return max(0.0, min(m.quarantined_until for m in self.members) - now)
+
+    def report(self, member, status_code=None, latency=None):
+        """Aktualizuje zdrowie członka po zapytaniu (status_code=None oznacza błąd sieci)."""
+        member.requests += 1
+        ok = status_code is not None and status_code < 400
+        member.success_rate = (1 - HEALTH_DECAY) * member.success_rate + HEALTH_DECAY * (1.0 if ok else 0.0)
+        if latency is not None:
+            member.latency = (1 - HEALTH_DECAY) * member.latency + HEALTH_DECAY * latency
+
+        if status_code in BLOCK_STATUSES:
+            member.consecutive_blocks += 1
+            cooldown = min(COOLDOWN_BASE * 2 ** (member.consecutive_blocks - 1), COOLDOWN_MAX)
+            member.quarantined_until = self.clock() + cooldown
+            print(f"  Kwarantanna {member.profile} ({member.proxy or 'direct'}) na {cooldown}s po HTTP {status_code}")
+        elif ok:
+            member.consecutive_blocks = 0
+
+    async def get(self, client, url, **kwargs):
+        """Wykonuje GET przez wybranego członka puli i zapisuje wynik w jego statystykach."""
+        member = self.pick()
+        headers = {**PROFILE_HEADERS, **kwargs.pop('headers', {})}
+        start = self.clock()
+        try:
+            response = await client.get(url, impersonate=member.profile, proxy=member.proxy, headers=headers, **kwargs)
+        except Exception:
+            self.report(member, None, self.clock() - start)
+            raise
+        self.report(member, response.status_code, self.clock() - start)
+        return response
+
+    def snapshot(self):
+        """Stan puli (do logów / diagnostyki)."""
+        now = self.clock()
+        return [
+            {
+                'profile': m.profile,
+                'proxy': m.proxy,
+                'score': round(m.score, 3),
+                'requests': m.requests,
+                'quarantined_for': round(max(0.0, m.quarantined_until - now), 1),
+            }
+            for m in self.members
+        ]
+
+
+# Wspólna pula dla scrapera listingu i szczegółów ofert
+FETCH_POOL = FetchPool.from_env()
@@ -2,123 +2,225 @@ import asyncio
 import json
 from curl_cffi.requests import AsyncSession
 from bs4 import BeautifulSoup
+from retry_policy import fetch_with_retry, DEFAULT_POLICY
+from raw_archive import default_archive
+from payload_schema import decode_offer, decode_section_model, record_drift, SchemaError
 
-async def get_offer_details(url):
+async def get_offer_details(url, client=None, policy=DEFAULT_POLICY):
     """
     Pobiera szczegółowe informacje o ofercie pracy z Pracuj.pl
     
     Args:
         url: Link do oferty na Pracuj.pl
+        client: Współdzielona sesja AsyncSession (przy sprawdzaniu wielu ofert); domyślnie nowa
+        policy: RetryPolicy dla tego pobrania
         
     Returns:
-        dict: Słownik ze szczegółami oferty
+        dict: Słownik ze szczegółami oferty (z liczbą zapytań w "attempts")
     """
-    async with AsyncSession() as session:
+    if client is None:
+        async with AsyncSession() as session:
+            return await get_offer_details(url, session, policy)
+
+    try:
+        # Ponowienia i bezpiecznik hosta wspólne ze scraperem listingu
+        outcome = await fetch_with_retry(client, url, policy=policy)
+        
+        if not outcome['ok']:
+            return {"error": outcome['error'], "status": outcome['status'], "attempts": outcome['attempts']}
+        
+        response = outcome['response']
+        soup = BeautifulSoup(response.text, 'html.parser')
+        script_tag = soup.find("script", id="__NEXT_DATA__")
+        
+        if not script_tag:
+            return {"error": "Nie znaleziono __NEXT_DATA__", "attempts": outcome['attempts']}
+        
+        # Surowy payload do archiwum (ponowne parsowanie bez pobierania)
+        archive = default_archive()
+        if archive is not None:
+            try:
+                await asyncio.to_thread(archive.put, script_tag.string, "offer", url)
+            except Exception as e:
+                print(f"Błąd zapisu do archiwum: {e}")
+
+        # Liczba zapytań HTTP (z ponowieniami) - np. do budżetu sprawdzania aktualności ofert
+        return {**parse_offer_details(script_tag.string, url), "attempts": outcome['attempts']}
+        
+    except Exception as e:
+        return {"error": str(e)}
+
+def parse_offer_details(payload, url):
+    """
+    Wyciąga szczegóły oferty z JSON-a __NEXT_DATA__ (bez sieci - używane też przy odtwarzaniu archiwum).
+
+    Args:
+        payload: Surowy JSON (str/bytes - dekodowane są tylko potrzebne pola) albo słownik
+        url: Link do oferty
+
+    Returns:
+        dict: Słownik ze szczegółami oferty albo {"error": ...}
+    """
+    try:
+        offer = decode_offer(payload)
+    except SchemaError as e:
+        # Zmiana struktury strony: liczymy ją i wracamy do tolerancyjnego parsera
+        record_drift("offer", e)
         try:
-            response = await session.get(
-                url,
-                impersonate="chrome110",
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                return {"error": f"HTTP {response.status_code}"}
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            script_tag = soup.find("script", id="__NEXT_DATA__")
-            
-            if not script_tag:
-                return {"error": "Nie znaleziono __NEXT_DATA__"}
-            
-            data = json.loads(script_tag.string)
-            
-            # Nawigacja do danych oferty
-            queries = data.get('props', {}).get('pageProps', {}).get('dehydratedState', {}).get('queries', [])
-            
-            if not queries:
-                return {"error": "Brak danych w queries"}
-            
-            # Pierwszy element queries zawiera dane oferty
-            offer_data = queries[0].get('state', {}).get('data', {})
-            
-            if not offer_data:
-                return {"error": "Brak danych oferty"}
-            
-            # Ekstrakcja danych
-            attributes = offer_data.get('attributes', {})
-            sections = offer_data.get('sections', [])
-            employment = attributes.get('employment', {})
-            
-            # Podstawowe informacje
-            result = {
-                'title': attributes.get('jobTitle', 'N/A'),
-                'company': attributes.get('displayEmployerName', 'N/A'),
-                'url': url,
-                'offer_id': offer_data.get('jobOfferWebId', 'N/A'),
-                'publication_date': offer_data.get('publicationDetails', {}).get('dateOfInitialPublicationUtc', 'N/A'),
-                'expiration_date': offer_data.get('publicationDetails', {}).get('expirationDateUtc', 'N/A'),
-                'is_active': offer_data.get('publicationDetails', {}).get('isActive', False),
-            }
-            
-            # Lokalizacja
-            workplaces = attributes.get('workplaces', [])
-            if workplaces:
-                wp = workplaces[0]
-                result['location'] = wp.get('displayAddress', 'N/A')
-                result['region'] = wp.get('region', {}).get('name', 'N/A')
-            else:
-                result['location'] = 'N/A'
-                result['region'] = 'N/A'
-            
-            # Zatrudnienie
-            result['position_levels'] = [p.get('name', '') for p in employment.get('positionLevels', [])]
-            result['work_schedules'] = [w.get('name', '') for w in employment.get('workSchedules', [])]
-            result['contract_types'] = [c.get('name', '') for c in employment.get('typesOfContracts', [])]
-            result['work_modes'] = [m.get('name', '') for m in employment.get('workModes', [])]
-            result['remote_work'] = employment.get('entirelyRemoteWork', False)
+            data = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+        except ValueError as e:
+            return {"error": str(e)}
+        return _parse_offer_details_untyped(data, url)
+
+    try:
+        attributes = offer.attributes
+        employment = attributes.employment
+        publication = offer.publicationDetails
+
+        # Podstawowe informacje
+        result = {
+            'title': attributes.jobTitle,
+            'company': attributes.displayEmployerName,
+            'url': url,
+            'offer_id': offer.jobOfferWebId,
+            'publication_date': publication.dateOfInitialPublicationUtc,
+            'expiration_date': publication.expirationDateUtc,
+            'is_active': publication.isActive,
+        }
+
+        # Lokalizacja
+        if attributes.workplaces:
+            workplace = attributes.workplaces[0]
+            result['location'] = workplace.displayAddress
+            result['region'] = workplace.region.name
+        else:
+            result['location'] = 'N/A'
+            result['region'] = 'N/A'
+
+        # Zatrudnienie
+        result['position_levels'] = [p.name for p in employment.positionLevels]
+        result['work_schedules'] = [w.name for w in employment.workSchedules]
+        result['contract_types'] = [c.name for c in employment.typesOfContracts]
+        result['work_modes'] = [m.name for m in employment.workModes]
+        result['remote_work'] = employment.entirelyRemoteWork
+
+        # Wynagrodzenie (jeśli dostępne)
+        salaries = [f"{c.name}: {c.salary}" for c in employment.typesOfContracts if c.salary]
+        result['salary'] = ', '.join(salaries) if salaries else 'Nie podano'
+
+        # Kategorie
+        result['categories'] = [f"{c.parent.name} > {c.name}" for c in attributes.categories]
+
+        # Sekcje oferty (model dekodowany tylko dla sekcji, których używamy)
+        for section in offer.sections:
+            if section.sectionType == 'responsibilities':
+                result['responsibilities'] = decode_section_model(section).bullets
+            elif section.sectionType == 'requirements':
+                # Wymagania są w subsekcjach
+                for subsection in section.subSections:
+                    if subsection.sectionType == 'requirements-expected':
+                        result['requirements'] = decode_section_model(subsection).bullets
+            elif section.sectionType == 'offered':
+                result['offered'] = decode_section_model(section).bullets
+            elif section.sectionType == 'benefits':
+                result['benefits'] = [item.name for item in decode_section_model(section).items]
+            elif section.sectionType == 'about-hr-consulting-agency-client':
+                result['about_company'] = decode_section_model(section).paragraphs
+
+        return result
+    except SchemaError as e:
+        record_drift("offer", e)
+        return _parse_offer_details_untyped(json.loads(payload) if isinstance(payload, (str, bytes)) else payload, url)
+
+def _parse_offer_details_untyped(data, url):
+    # Dotychczasowe, tolerancyjne przechodzenie po słownikach - używane, gdy payload nie pasuje do schematu
+    try:
+        # Nawigacja do danych oferty
+        queries = data.get('props', {}).get('pageProps', {}).get('dehydratedState', {}).get('queries', [])
+        
+        if not queries:
+            return {"error": "Brak danych w queries"}
+        
+        # Pierwszy element queries zawiera dane oferty
+        offer_data = queries[0].get('state', {}).get('data', {})
+        
+        if not offer_data:
+            return {"error": "Brak danych oferty"}
+        
+        # Ekstrakcja danych
+        attributes = offer_data.get('attributes', {})
+        sections = offer_data.get('sections', [])
+        employment = attributes.get('employment', {})
+        
+        # Podstawowe informacje
+        result = {
+            'title': attributes.get('jobTitle', 'N/A'),
+            'company': attributes.get('displayEmployerName', 'N/A'),
+            'url': url,
+            'offer_id': offer_data.get('jobOfferWebId', 'N/A'),
+            'publication_date': offer_data.get('publicationDetails', {}).get('dateOfInitialPublicationUtc', 'N/A'),
+            'expiration_date': offer_data.get('publicationDetails', {}).get('expirationDateUtc', 'N/A'),
+            'is_active': offer_data.get('publicationDetails', {}).get('isActive'),
+        }
+        
+        # Lokalizacja
+        workplaces = attributes.get('workplaces', [])
+        if workplaces:
+            wp = workplaces[0]
+            result['location'] = wp.get('displayAddress', 'N/A')
+            result['region'] = wp.get('region', {}).get('name', 'N/A')
+        else:
+            result['location'] = 'N/A'
+            result['region'] = 'N/A'
+        
+        # Zatrudnienie
+        result['position_levels'] = [p.get('name', '') for p in employment.get('positionLevels', [])]
+        result['work_schedules'] = [w.get('name', '') for w in employment.get('workSchedules', [])]
+        result['contract_types'] = [c.get('name', '') for c in employment.get('typesOfContracts', [])]
+        result['work_modes'] = [m.get('name', '') for m in employment.get('workModes', [])]
+        result['remote_work'] = employment.get('entirelyRemoteWork', False)
+        
+        # Wynagrodzenie (jeśli dostępne)
+        contracts = employment.get('typesOfContracts', [])
+        salaries = []
+        for contract in contracts:
+            salary = contract.get('salary')
+            if salary:
+                salaries.append(f"{contract.get('name')}: {salary}")
+        result['salary'] = ', '.join(salaries) if salaries else 'Nie podano'
+        
+        # Kategorie
+        categories = attributes.get('categories', [])
+        result['categories'] = [f"{c.get('parent', {}).get('name', '')} > {c.get('name', '')}" for c in categories]
+        
+        # Sekcje oferty
+        for section in sections:
+            section_type = section.get('sectionType')
+            model = section.get('model', {})
             
-            # Wynagrodzenie (jeśli dostępne)
-            contracts = employment.get('typesOfContracts', [])
-            salaries = []
-            for contract in contracts:
-                salary = contract.get('salary')
-                if salary:
-                    salaries.append(f"{contract.get('name')}: {salary}")
-            result['salary'] = ', '.join(salaries) if salaries else 'Nie podano'
+            if section_type == 'responsibilities':
+                result['responsibilities'] = model.get('bullets', [])
             
-            # Kategorie
-            categories = attributes.get('categories', [])
-            result['categories'] = [f"{c.get('parent', {}).get('name', '')} > {c.get('name', '')}" for c in categories]
+            elif section_type == 'requirements':
+                # Wymagania są w subsekcjach
+                subsections = section.get('subSections', [])
+                for subsection in subsections:
+                    if subsection.get('sectionType') == 'requirements-expected':
+                        result['requirements'] = subsection.get('model', {}).get('bullets', [])
             
-            # Sekcje oferty
-            for section in sections:
-                section_type = section.get('sectionType')
-                model = section.get('model', {})
-                
-                if section_type == 'responsibilities':
-                    result['responsibilities'] = model.get('bullets', [])
-                
-                elif section_type == 'requirements':
-                    # Wymagania są w subsekcjach
-                    subsections = section.get('subSections', [])
-                    for subsection in subsections:
-                        if subsection.get('sectionType') == 'requirements-expected':
-                            result['requirements'] = subsection.get('model', {}).get('bullets', [])
-                
-                elif section_type == 'offered':
-                    result['offered'] = model.get('bullets', [])
-                
-                elif section_type == 'benefits':
-                    items = model.get('items', [])
-                    result['benefits'] = [item.get('name', '') for item in items]
-                
-                elif section_type == 'about-hr-consulting-agency-client':
-                    result['about_company'] = model.get('paragraphs', [])
+            elif section_type == 'offered':
+                result['offered'] = model.get('bullets', [])
             
-            return result
+            elif section_type == 'benefits':
+                items = model.get('items', [])
+                result['benefits'] = [item.get('name', '') for item in items]
             
-        except Exception as e:
-            return {"error": str(e)}
+            elif section_type == 'about-hr-consulting-agency-client':
+                result['about_company'] = model.get('paragraphs', [])
+        
+        return result
+    except Exception as e:
+        return {"error": str(e)}
 
 async def main():
     # Test URL - przykładowa oferta
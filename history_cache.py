@@ -0,0 +1,133 @@
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# --- KONFIGURACJA CACHE HISTORII ---
+PAGE_CACHE_DURATION = timedelta(seconds=60) # Krótki TTL - historia zmienia się tylko po nowym scrapowaniu
+MAX_CACHED_PAGES = 500
+MAX_JUMP_PAGES = 20 # Ile stron możemy "przewinąć" naraz przy skoku do dalekiej strony
+
+
+def _token_key(token):
+    # Token kontynuacji z Azure to słownik - zamieniamy go na klucz słownika cache
+    return json.dumps(token, sort_keys=True) if token else ""
+
+
+class HistoryPageCache:
+    """
+    Cache stron historii ofert po stronie serwera.
+
+    Klucz strony to (grupa, filtr, token kontynuacji). Dla każdej pary (grupa, filtr)
+    pamiętamy listę tokenów kolejnych stron, dzięki czemu działa cofanie i skoki
+    do konkretnej strony, a następna strona jest pobierana w tle.
+    """
+
+    def __init__(self, storage_manager, results_per_page=100):
+        self.storage_manager = storage_manager
+        self.results_per_page = results_per_page
+        self._pages = {}   # { (grupa, filtr, token): {"timestamp": data, "result": {...}} }
+        self._tokens = {}  # { (grupa, filtr): [None, token_strony_2, token_strony_3, ...] }
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2)
+
+    def _load(self, group, keyword, token):
+        result = self.storage_manager.get_offers_paginated(
+            group,
+            results_per_page=self.results_per_page,
+            offset_token=token,
+            keyword=keyword
+        )
+        result['fetched_at'] = datetime.now(timezone.utc)
+        return result
+
+    def _fetch(self, group, keyword, token):
+        key = (group, keyword, _token_key(token))
+
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry and datetime.now() - entry['timestamp'] < PAGE_CACHE_DURATION:
+                return entry['result']
+            # Jeśli ta sama strona jest już pobierana (np. prefetch), czekamy na jej wynik
+            future = self._inflight.get(key)
+            if future is not None:
+                owner = False
+            else:
+                owner = True
+                future = self._inflight[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._load(group, keyword, token)
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+        with self._lock:
+            if len(self._pages) >= MAX_CACHED_PAGES:
+                oldest = min(self._pages, key=lambda k: self._pages[k]['timestamp'])
+                del self._pages[oldest]
+            self._pages[key] = {'timestamp': datetime.now(), 'result': result}
+        return result
+
+    def _remember_token(self, tokens, index, token):
+        with self._lock:
+            if token and len(tokens) == index:
+                tokens.append(token)
+
+    def invalidate(self, group):
+        """Czyści strony i tokeny grupy (np. po zapisaniu nowych ofert)."""
+        with self._lock:
+            self._pages = {k: v for k, v in self._pages.items() if k[0] != group}
+            self._tokens = {k: v for k, v in self._tokens.items() if k[0] != group}
+
+    def get_page(self, group, page, keyword=None):
+        """
+        Zwraca stronę historii (numerowaną od 1).
+
+        Returns:
+            dict: offers, page, has_prev, has_next, known_pages, etag, last_modified
+        """
+        with self._lock:
+            tokens = self._tokens.setdefault((group, keyword), [None])
+
+        # 1. Skok do strony, której token nie jest jeszcze znany - przechodzimy kolejne strony
+        page = max(page, 1)
+        while len(tokens) < page and page - len(tokens) <= MAX_JUMP_PAGES:
+            index = len(tokens) - 1
+            walked = self._fetch(group, keyword, tokens[index])
+            if not walked['next_token']:
+                break
+            self._remember_token(tokens, index + 1, walked['next_token'])
+        page = min(page, len(tokens))
+
+        # 2. Bieżąca strona (z cache lub z Azure)
+        result = self._fetch(group, keyword, tokens[page - 1])
+        self._remember_token(tokens, page, result['next_token'])
+
+        # 3. Prefetch następnej strony w tle, zanim użytkownik kliknie "Następne"
+        if result['next_token']:
+            self._executor.submit(self._fetch, group, keyword, result['next_token'])
+
+        offers = result['offers']
+        timestamps = [o.metadata.get('timestamp') for o in offers if getattr(o, 'metadata', None)]
+        versions = "|".join(f"{o.get('RowKey')}:{getattr(o, 'metadata', {}).get('etag')}" for o in offers)
+
+        return {
+            'offers': offers,
+            'page': page,
+            'has_prev': page > 1,
+            'has_next': bool(result['next_token']),
+            'known_pages': len(tokens),
+            # Nawigacja (liczba znanych stron, "Następne") też jest częścią strony - inaczej 304 zostawi starą
+            'etag': hashlib.md5(f"{group}|{keyword}|{page}|{len(tokens)}|{bool(result['next_token'])}|{versions}".encode()).hexdigest(),
+            'last_modified': max((t for t in timestamps if t), default=result['fetched_at']),
+        }
@@ -0,0 +1,214 @@
+import os
+import json
+import heapq
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from retry_policy import RetryPolicy
+
+# --- KONFIGURACJA SPRAWDZANIA AKTUALNOŚCI ---
+CHECK_BUDGET = int(os.getenv("LIVENESS_BUDGET", "200"))           # Maks. liczba zapytań HTTP (z ponowieniami) na uruchomienie
+CHECK_CONCURRENCY = int(os.getenv("LIVENESS_CONCURRENCY", "4"))   # Jednocześnie sprawdzane oferty
+ASSUMED_LIFETIME = timedelta(days=30)    # Typowy czas publikacji, gdy nie znamy daty wygaśnięcia
+MIN_RECHECK_INTERVAL = timedelta(days=3) # Oferta sprawdzona niedawno nie wraca od razu do kolejki
+EXPIRED_STATUSES = {404, 410}            # Strona oferty zniknęła = oferta wygasła
+# Krótsza polityka niż przy scrapowaniu - jedna nieudana oferta nie blokuje budżetu
+CHECK_POLICY = RetryPolicy(max_attempts=2, deadline=30.0)
+CANDIDATE_FIELDS = ["PartitionKey", "RowKey", "Link", "ScrapedAt", "LastSeenAt", "LastCheckedAt", "ExpiresAt", "IsActive"]
+
+
+def parse_time(value):
+    """ISO (z 'Z' albo bez strefy - wtedy UTC, jak datetime.utcnow() w storage.py) -> datetime UTC albo None."""
+    if not value or value == "N/A":
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def check_due(entity):
+    """
+    Kiedy ofertę warto sprawdzić i kiedy ostatnio była widziana.
+
+    Termin to data wygaśnięcia (z wcześniejszego sprawdzenia), a bez niej - ostatnie
+    zobaczenie + ASSUMED_LIFETIME. Oferta sprawdzona niedawno czeka co najmniej
+    MIN_RECHECK_INTERVAL, żeby te same linki nie zjadały budżetu przy każdym uruchomieniu.
+
+    Returns:
+        tuple: (termin sprawdzenia, ostatnio widziana) - klucz kolejki priorytetowej
+    """
+    epoch = datetime.min.replace(tzinfo=timezone.utc)
+    last_seen = max(parse_time(entity.get("ScrapedAt")) or epoch, parse_time(entity.get("LastSeenAt")) or epoch)
+    due = parse_time(entity.get("ExpiresAt")) or last_seen + ASSUMED_LIFETIME
+    last_checked = parse_time(entity.get("LastCheckedAt"))
+    if last_checked is not None:
+        due = max(due, last_checked + MIN_RECHECK_INTERVAL)
+    return due, last_seen
+
+
+def build_queue(entities, now=None):
+    """
+    Kolejka priorytetowa ofert do sprawdzenia: najpierw te po terminie, potem najdawniej widziane.
+
+    Ten sam link może być zapisany pod kilkoma frazami (partycjami) - pobieramy go raz
+    i aktualizujemy wszystkie jego encje. Oferty już oznaczone jako wygasłe są pomijane.
+
+    Returns:
+        list: Kopiec krotek (termin, ostatnio widziana, link, [encje]) - tylko oferty po terminie
+    """
+    now = now or datetime.now(timezone.utc)
+    links = {}
+    for entity in entities:
+        if entity.get("IsActive") is False or not entity.get("Link"):
+            continue
+        links.setdefault(entity["Link"], []).append(entity)
+
+    heap = []
+    for link, group in links.items():
+        # Liczy się najświeższa informacja o linku - zobaczenie pod dowolną frazą przesuwa termin
+        keys = [check_due(entity) for entity in group]
+        due, last_seen = max(key[0] for key in keys), max(key[1] for key in keys)
+        if due <= now:
+            heap.append((due, last_seen, link, group))
+    heapq.heapify(heap)
+    return heap
+
+
+def check_result(details, now):
+    """
+    Wynik pobrania szczegółów oferty -> pola do zapisania (MERGE) albo None, gdy wynik niepewny.
+
+    Niepewne (błąd sieci, 403, blokada, brak pola isActive) nie zmieniają statusu - oferta wróci w kolejnym uruchomieniu.
+    """
+    stamp = now.isoformat()
+    if "error" in details:
+        if details.get("status") in EXPIRED_STATUSES:
+            return {"IsActive": False, "ExpiredAt": stamp, "LastCheckedAt": stamp}
+        return None
+
+    if details.get("is_active") is None:
+        # Strona bez publicationDetails.isActive - nie zgadujemy, że oferta wygasła
+        return None
+    if details["is_active"] is False:
+        return {"IsActive": False, "ExpiredAt": stamp, "LastCheckedAt": stamp}
+
+    fields = {"IsActive": True, "LastSeenAt": stamp, "LastCheckedAt": stamp}
+    expires_at = parse_time(details.get("expiration_date"))
+    if expires_at is not None:
+        fields["ExpiresAt"] = expires_at.isoformat()
+    return fields
+
+
+async def check_offers(heap, budget=CHECK_BUDGET, concurrency=CHECK_CONCURRENCY, client=None, group=None, now=None):
+    """
+    Sprawdza oferty z kolejki (od najpilniejszych), wysyłając najwyżej `budget` zapytań HTTP.
+
+    Przed każdym sprawdzeniem rezerwowane jest CHECK_POLICY.max_attempts zapytań, a po
+    nim niewykorzystana część wraca do budżetu - ponowienia nigdy go nie przekroczą.
+
+    Pobrania idą przez get_offer_details, czyli pulę profili, ponowienia i bezpiecznik
+    hosta oraz przez SCRAPE_SCHEDULER procesu. Te limity są wspólne ze scrapowaniem
+    tylko wtedy, gdy sprawdzanie działa w procesie aplikacji - `python liveness.py`
+    ma własne (ogranicza go wtedy concurrency i budżet). Otwarty bezpiecznik kończy
+    uruchomienie bez zmian w pozostałych ofertach.
+
+    Returns:
+        tuple: (lista aktualizacji encji, statystyki)
+    """
+    from curl_cffi.requests import AsyncSession
+    from get_offer_details import get_offer_details
+    from fair_scheduler import SCRAPE_SCHEDULER
+
+    now = now or datetime.now(timezone.utc)
+    updates = []
+    stats = {"checked": 0, "requests": 0, "active": 0, "expired": 0, "unknown": 0, "skipped": 0, "stopped": None}
+    reserve = CHECK_POLICY.max_attempts
+    lock = asyncio.Lock()
+
+    async def worker(session):
+        while True:
+            async with lock:
+                if not heap or stats["requests"] + reserve > budget or stats["stopped"]:
+                    return
+                item = heapq.heappop(heap)
+                stats["checked"] += 1
+                stats["requests"] += reserve
+            _, _, link, entities = item
+
+            async with SCRAPE_SCHEDULER.slot(group, "liveness"):
+                details = await get_offer_details(link, client=session, policy=CHECK_POLICY)
+            # Zwrot niewykorzystanej rezerwy (błąd przed pobraniem = 0 zapytań, wyjątek = liczymy 1)
+            stats["requests"] -= reserve - details.get("attempts", 1)
+
+            if details.get("error") == "circuit_open":
+                # Pracuj.pl blokuje - nie marnujemy budżetu i nie zgadujemy statusu
+                async with lock:
+                    stats["stopped"] = "circuit_open"
+                    stats["checked"] -= 1
+                    heapq.heappush(heap, item)
+                return
+
+            fields = check_result(details, now)
+            if fields is None:
+                stats["unknown"] += 1
+                continue
+            stats["active" if fields["IsActive"] else "expired"] += 1
+            updates.extend({"PartitionKey": e["PartitionKey"], "RowKey": e["RowKey"], **fields} for e in entities)
+
+    async def run(session):
+        await asyncio.gather(*(worker(session) for _ in range(max(1, concurrency))))
+
+    if client is None:
+        async with AsyncSession() as session:
+            await run(session)
+    else:
+        await run(client)
+
+    stats["skipped"] = len(heap)
+    return updates, stats
+
+
+def refresh_group(storage_manager, group_name, budget=CHECK_BUDGET, concurrency=CHECK_CONCURRENCY):
+    """
+    Jedno uruchomienie dla działu: kolejka z tabeli Offers{group_name}, sprawdzenie w budżecie, zapis MERGE.
+
+    Returns:
+        dict: Statystyki uruchomienia
+    """
+    now = datetime.now(timezone.utc)
+    entities = storage_manager.get_all_offers(group_name, select=CANDIDATE_FIELDS)
+    heap = build_queue(entities, now)
+    due = len(heap)
+
+    updates, stats = asyncio.run(check_offers(heap, budget, concurrency, group=group_name, now=now))
+    stats.update(offers=len(entities), due=due, updated=storage_manager.merge_offers(group_name, updates) if updates else 0)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sprawdzanie aktualności zapisanych ofert")
+    parser.add_argument("--group", required=True, action="append", help="Dział (można podać wiele razy)")
+    parser.add_argument("--budget", type=int, default=CHECK_BUDGET, help="Maks. liczba zapytań HTTP na dział (z ponowieniami)")
+    parser.add_argument("--concurrency", type=int, default=CHECK_CONCURRENCY)
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from storage import AzureTableManager
+
+    load_dotenv()
+    storage_manager = AzureTableManager(os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
+    for group_name in args.group:
+        stats = refresh_group(storage_manager, group_name, args.budget, args.concurrency)
+        print(f"Offers{group_name}: {json.dumps(stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import re
+import sys
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional, Union
+
+import msgspec
+
+# --- SCHEMAT __NEXT_DATA__ ---
+# Nazwy pól celowo jak w JSON-ie Pracuj.pl (camelCase), żeby dekoder mógł je mapować 1:1.
+# Pola bez wartości domyślnej są wymagane - ich brak to zmiana schematu (schema drift).
+
+# Pole dekodowane dopiero na żądanie (surowe bajty JSON-a)
+RawJSON = msgspec.Raw
+
+
+class SchemaError(ValueError):
+    """Payload nie pasuje do schematu (brak wymaganego pola albo inny typ)."""
+
+
+@dataclass
+class QueryState:
+    data: RawJSON = None # Kształt zależy od zapytania - dekodowany osobno
+
+
+@dataclass
+class Query:
+    state: QueryState = field(default_factory=QueryState)
+
+
+@dataclass
+class DehydratedState:
+    queries: list[Query] = field(default_factory=list)
+
+
+@dataclass
+class PageProps:
+    dehydratedState: DehydratedState
+
+
+@dataclass
+class Props:
+    pageProps: PageProps
+
+
+@dataclass
+class NextData:
+    props: Props
+
+
+# Listing (strona wyników wyszukiwania)
+
+@dataclass
+class ListingOffer:
+    offerAbsoluteUri: Optional[str] = None
+    displayWorkplace: Optional[str] = None
+
+
+@dataclass
+class GroupedOffer:
+    jobTitle: str
+    companyName: Optional[str] = None
+    salaryDisplayText: Optional[str] = None
+    positionLevels: Optional[list[str]] = None
+    aiSummary: Optional[str] = None
+    offers: list[ListingOffer] = field(default_factory=list)
+
+
+@dataclass
+class ListingQueryData:
+    groupedOffers: Optional[list[GroupedOffer]] = None
+
+
+# Inne zapytania na stronie mają dowolne dane - obiekt bez groupedOffers dekoduje się do pustego ListingQueryData
+ListingData = Union[ListingQueryData, list, str, int, float, bool, None]
+
+
+# Szczegóły oferty
+
+@dataclass
+class NamedItem:
+    name: str = ""
+
+
+@dataclass
+class Region:
+    name: str = "N/A"
+
+
+@dataclass
+class Workplace:
+    displayAddress: str = "N/A"
+    region: Region = field(default_factory=Region)
+
+
+@dataclass
+class ContractType:
+    name: Optional[str] = None
+    salary: Any = None
+
+
+@dataclass
+class Employment:
+    positionLevels: list[NamedItem] = field(default_factory=list)
+    workSchedules: list[NamedItem] = field(default_factory=list)
+    typesOfContracts: list[ContractType] = field(default_factory=list)
+    workModes: list[NamedItem] = field(default_factory=list)
+    entirelyRemoteWork: bool = False
+
+
+@dataclass
+class Category:
+    name: str = ""
+    parent: NamedItem = field(default_factory=NamedItem)
+
+
+@dataclass
+class Attributes:
+    jobTitle: str
+    displayEmployerName: str
+    workplaces: list[Workplace] = field(default_factory=list)
+    employment: Employment = field(default_factory=Employment)
+    categories: list[Category] = field(default_factory=list)
+
+
+@dataclass
+class SectionModel:
+    bullets: list[str] = field(default_factory=list)
+    paragraphs: list[str] = field(default_factory=list)
+    items: list[NamedItem] = field(default_factory=list)
+
+
+@dataclass
+class Section:
+    sectionType: Optional[str] = None
+    model: RawJSON = None # Model zależy od typu sekcji - dekodujemy tylko sekcje, których używamy
+    subSections: list["Section"] = field(default_factory=list)
+
+
+@dataclass
+class PublicationDetails:
+    dateOfInitialPublicationUtc: str = "N/A"
+    expirationDateUtc: str = "N/A"
+    isActive: Optional[bool] = None # Brak pola = status nieznany (nie "wygasła")
+
+
+@dataclass
+class OfferData:
+    attributes: Attributes
+    jobOfferWebId: Union[str, int] = "N/A"
+    publicationDetails: PublicationDetails = field(default_factory=PublicationDetails)
+    sections: list[Section] = field(default_factory=list)
+
+
+# --- LICZNIK ZMIAN SCHEMATU ---
+# { ("listing", "$.props.pageProps..."): liczba wystąpień }
+SCHEMA_DRIFT = {}
+INDEX_PATTERN = re.compile(r"\[\d+\]")
+
+
+def record_drift(kind, error):
+    """Zlicza błąd schematu (indeksy list w ścieżce są pomijane, żeby grupować ten sam problem)."""
+    key = (kind, INDEX_PATTERN.sub("[]", str(error)))
+    SCHEMA_DRIFT[key] = SCHEMA_DRIFT.get(key, 0) + 1
+    if SCHEMA_DRIFT[key] == 1:
+        print(f"Zmiana schematu [{kind}]: {error}")
+
+
+def drift_report():
+    return [
+        {"kind": kind, "error": error, "count": count}
+        for (kind, error), count in sorted(SCHEMA_DRIFT.items(), key=lambda item: -item[1])
+    ]
+
+
+# --- DEKODOWANIE ---
+# Dekodery msgspec: { typ: msgspec.json.Decoder }
+DECODERS = {}
+
+
+def decode(payload, tp):
+    """
+    Dekoduje JSON (str/bytes, RawJSON albo gotowy obiekt, np. słownik) do typu tp.
+
+    Pola spoza schematu są tylko przeskakiwane w bajtach - nie powstają dla nich
+    słowniki ani stringi. Błąd schematu zgłaszany jest jako SchemaError.
+    """
+    if isinstance(payload, str) and type(payload) is not str:
+        payload = str(payload) # np. NavigableString z BeautifulSoup - msgspec przyjmuje tylko czysty str
+    if tp not in DECODERS:
+        DECODERS[tp] = msgspec.json.Decoder(tp)
+    try:
+        if not isinstance(payload, (str, bytes, bytearray, memoryview, msgspec.Raw)):
+            # Gotowy obiekt (rzadko - np. słownik z testów): przez bajty, żeby pola RawJSON działały tak samo
+            payload = msgspec.json.encode(payload)
+        return DECODERS[tp].decode(payload)
+    except msgspec.ValidationError as e:
+        raise SchemaError(str(e)) from None
+    except msgspec.DecodeError as e:
+        raise SchemaError(f"Niepoprawny JSON: {e}") from None
+
+
+def decode_raw(value, tp, path):
+    """Dekoduje pole RawJSON; path uzupełnia ścieżkę w komunikacie błędu."""
+    try:
+        return decode(value, tp)
+    except SchemaError as e:
+        message = str(e)
+        # msgspec nie dopisuje ścieżki dla błędów w korzeniu dekodowanego fragmentu
+        message = message.replace("`$", f"`{path}") if " - at `$" in message else f"{message} - at `{path}`"
+        raise SchemaError(message) from None
+
+
+def decode_listing(payload):
+    """
+    Zwraca listę GroupedOffer ze strony wyników.
+
+    Raises:
+        SchemaError: payload nie pasuje do schematu albo nie ma w nim groupedOffers
+    """
+    next_data = decode(payload, NextData)
+    groups = None
+    for i, query in enumerate(next_data.props.pageProps.dehydratedState.queries):
+        data = decode_raw(query.state.data, ListingData, f"$.props.pageProps.dehydratedState.queries[{i}].state.data")
+        if isinstance(data, ListingQueryData) and data.groupedOffers is not None:
+            groups = (groups or []) + data.groupedOffers
+    if groups is None:
+        raise SchemaError("Brak groupedOffers w żadnym zapytaniu - at `$.props.pageProps.dehydratedState.queries`")
+    return groups
+
+
+def decode_offer(payload):
+    """
+    Zwraca OfferData (pierwsze zapytanie na stronie oferty).
+
+    Raises:
+        SchemaError: payload nie pasuje do schematu
+    """
+    queries = decode(payload, NextData).props.pageProps.dehydratedState.queries
+    if not queries or queries[0].state.data is None:
+        raise SchemaError("Brak danych oferty - at `$.props.pageProps.dehydratedState.queries[0].state.data`")
+    return decode_raw(queries[0].state.data, OfferData, "$.props.pageProps.dehydratedState.queries[0].state.data")
+
+
+def decode_section_model(section):
+    if section.model is None:
+        return SectionModel()
+    return decode_raw(section.model, SectionModel, f"$.sections[{section.sectionType}].model")
+
+
+# --- BENCHMARK ---
+
+def _synthetic_listing(groups=50, noise=400):
+    # Zbliżony do prawdziwej strony: oferty + duże zapytania, których nie używamy (filtry, SEO, słowniki)
+    return json.dumps({"props": {"pageProps": {"dehydratedState": {"queries": [
+        {"state": {"data": {"filters": [{"id": i, "label": f"Filtr {i}", "values": list(range(20))} for i in range(noise)]}}},
+        {"state": {"data": {"groupedOffers": [
+            {
+                "jobTitle": f"Python Developer {i}", "companyName": "ACME sp. z o.o.",
+                "salaryDisplayText": "12 000–18 000 zł brutto / mies.", "positionLevels": ["specjalista (Mid / Regular)"],
+                "aiSummary": "", "groupId": i, "logoUrl": "https://example.com/logo.png" * 3,
+                "offers": [{"offerAbsoluteUri": f"https://www.pracuj.pl/praca/oferta,{i}", "displayWorkplace": "Warszawa", "partitionId": i}],
+            }
+            for i in range(groups)
+        ]}}},
+    ]}}}}, ensure_ascii=False)
+
+
+def benchmark(payloads, repeat=20):
+    """Porównuje dotychczasowe przechodzenie słowników (json.loads + .get) z typowanym dekodowaniem."""
+    from scraper import PracujScraper
+
+    scraper = PracujScraper()
+    raw_size = sum(len(p) for p in payloads)
+    results = {}
+    for name, parse in (
+        ("dict walking", lambda p: scraper._parse_data_untyped(json.loads(p), "bench")),
+        ("typed decode", lambda p: scraper.parse_data(p, "bench")),
+    ):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for payload in payloads:
+                parse(payload)
+        elapsed = (time.perf_counter() - start) / (repeat * len(payloads))
+        results[name] = elapsed
+        print(f"{name:>14}: {elapsed * 1000:7.3f} ms / payload")
+    print(f"Payloady: {len(payloads)}, średnio {raw_size / len(payloads) / 1024:.0f} KB")
+    return results
+
+
+if __name__ == "__main__":
+    # python payload_schema.py [katalog archiwum] - bez argumentu na danych syntetycznych
+    if len(sys.argv) > 1:
+        from raw_archive import RawArchive, read_object
+
+        archive = RawArchive(sys.argv[1])
+        payloads = [read_object(archive.root, e["digest"], e["codec"]) for e in archive.entries("listing")[:200]]
+    else:
+        payloads = [_synthetic_listing().encode("utf-8")]
+    benchmark(payloads)
@@ -0,0 +1,285 @@
+import os
+import gzip
+import json
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+import zstandard
+
+# --- KONFIGURACJA ARCHIWUM ---
+# Na App Service warto wskazać trwały, współdzielony katalog, np. /home/raw_archive
+ARCHIVE_PATH = os.getenv("RAW_ARCHIVE_PATH", "raw_archive")
+ARCHIVE_ENABLED = os.getenv("RAW_ARCHIVE_ENABLED", "1") == "1"
+ZSTD_LEVEL = 10
+REPARSE_CHUNK = 32 # Liczba payloadów przekazywanych naraz do procesu parsującego
+
+# Domyślne archiwum procesu, tworzone przy pierwszym zapisie: { "archive": RawArchive }
+DEFAULT_ARCHIVE = {}
+DEFAULT_ARCHIVE_LOCK = threading.Lock()
+
+
+def compress(data):
+    """Zwraca (kodek, skompresowane bajty)."""
+    return "zst", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def decompress(codec, blob):
+    if codec == "zst":
+        return zstandard.ZstdDecompressor().decompress(blob)
+    # Obiekty zapisane gzipem przez wcześniejsze wersje archiwum
+    return gzip.decompress(blob)
+
+
+def object_path(root, digest, codec):
+    # Dwa pierwsze znaki hasha jako podkatalog - bez tysięcy plików w jednym folderze
+    return os.path.join(root, "objects", digest[:2], f"{digest}.json.{codec}")
+
+
+def default_archive():
+    """Archiwum wspólne dla scrapera listingu i szczegółów ofert (None, jeśli wyłączone)."""
+    if not ARCHIVE_ENABLED:
+        return None
+    if "archive" not in DEFAULT_ARCHIVE:
+        with DEFAULT_ARCHIVE_LOCK:
+            if "archive" not in DEFAULT_ARCHIVE:
+                DEFAULT_ARCHIVE["archive"] = RawArchive(ARCHIVE_PATH)
+    return DEFAULT_ARCHIVE["archive"]
+
+
+class RawArchive:
+    """
+    Archiwum surowych payloadów __NEXT_DATA__ adresowane treścią (SHA-256).
+
+    Każdy unikalny JSON zapisywany jest raz (skompresowany zstd), a manifest w SQLite notuje każde pobranie: rodzaj strony,
+    URL, frazę, numer strony i czas. Dzięki temu po zmianie parserów można
+    odtworzyć wyniki bez ponownego pobierania danych z Pracuj.pl.
+    """
+
+    def __init__(self, root=ARCHIVE_PATH):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "manifest.db"), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS payloads (
+                    digest TEXT PRIMARY KEY,
+                    codec TEXT NOT NULL,
+                    raw_size INTEGER,
+                    stored_size INTEGER,
+                    first_seen TEXT
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS fetches (
+                    id INTEGER PRIMARY KEY,
+                    digest TEXT NOT NULL REFERENCES payloads(digest),
+                    kind TEXT NOT NULL,
+                    url TEXT,
+                    keyword TEXT,
+                    page INTEGER,
+                    fetched_at TEXT
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS fetches_kind ON fetches (kind, keyword, fetched_at)")
+
+    def put(self, raw, kind, url, keyword=None, page=None):
+        """
+        Zapisuje payload (jeśli jeszcze go nie ma) i dopisuje pobranie do manifestu.
+
+        Args:
+            raw: Treść tagu __NEXT_DATA__ (str)
+            kind: "listing" (strona wyników) albo "offer" (szczegóły oferty)
+
+        Returns:
+            str: SHA-256 payloadu
+        """
+        data = raw.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        now = datetime.now(timezone.utc).isoformat()
+
+        with self._lock:
+            known = self._conn.execute("SELECT codec FROM payloads WHERE digest = ?", (digest,)).fetchone()
+        if known is None:
+            codec, blob = compress(data)
+            path = object_path(self.root, digest, codec)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Zapis przez plik tymczasowy - przerwany zapis nie zostawi uszkodzonego obiektu
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+
+        with self._lock, self._conn:
+            if known is None:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO payloads (digest, codec, raw_size, stored_size, first_seen) VALUES (?, ?, ?, ?, ?)",
+                    (digest, codec, len(data), len(blob), now)
+                )
+            self._conn.execute(
+                "INSERT INTO fetches (digest, kind, url, keyword, page, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, kind, url, keyword, page, now)
+            )
+        return digest
+
+    def get(self, digest):
+        """Zwraca zdekodowany JSON payloadu."""
+        with self._lock:
+            row = self._conn.execute("SELECT codec FROM payloads WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(digest)
+        return load_object(self.root, digest, row["codec"])
+
+    def entries(self, kind="listing", keywords=None, since=None):
+        """
+        Unikalne payloady danego rodzaju wraz z ostatnim pobraniem, od najstarszych.
+
+        Kolejność ma znaczenie przy uzupełnianiu bazy: nowsze dane nadpisują starsze.
+        """
+        query = """
+            SELECT f.digest, p.codec, f.url, f.keyword, f.page, MAX(f.fetched_at) AS fetched_at
+            FROM fetches f JOIN payloads p ON p.digest = f.digest
+            WHERE f.kind = ?
+        """
+        params = [kind]
+        if keywords:
+            query += f" AND f.keyword IN ({', '.join('?' for _ in keywords)})"
+            params.extend(keywords)
+        if since:
+            query += " AND f.fetched_at >= ?"
+            params.append(since)
+        query += " GROUP BY f.digest ORDER BY fetched_at"
+
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query, params).fetchall()]
+
+    def stats(self):
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT COUNT(*) AS payloads, COALESCE(SUM(raw_size), 0) AS raw_bytes, COALESCE(SUM(stored_size), 0) AS stored_bytes
+                FROM payloads
+            """).fetchone()
+            fetches = self._conn.execute("SELECT COUNT(*) FROM fetches").fetchone()[0]
+        return {**dict(row), "fetches": fetches}
+
+
+def read_object(root, digest, codec):
+    """Zwraca surowe bajty JSON-a (parsery dekodują z nich tylko potrzebne pola)."""
+    with open(object_path(root, digest, codec), "rb") as f:
+        return decompress(codec, f.read())
+
+
+def load_object(root, digest, codec):
+    return json.loads(read_object(root, digest, codec))
+
+
+# --- PONOWNE PARSOWANIE (bez ruchu sieciowego) ---
+
+def _parse_chunk(root, kind, entries):
+    # Uruchamiane w osobnym procesie - importy parserów dopiero tutaj
+    from scraper import PracujScraper
+    from get_offer_details import parse_offer_details
+
+    scraper = PracujScraper()
+    parsed = []
+    for entry in entries:
+        try:
+            data = read_object(root, entry["digest"], entry["codec"])
+        except (OSError, RuntimeError) as e:
+            print(f"Nie można odczytać {entry['digest']}: {e}")
+            continue
+        if kind == "listing":
+            parsed.append((entry, scraper.parse_data(data, entry["keyword"])))
+        else:
+            parsed.append((entry, parse_offer_details(data, entry["url"])))
+    return parsed
+
+
+def reparse(archive, kind="listing", keywords=None, since=None, workers=None):
+    """
+    Przepuszcza zarchiwizowane payloady przez aktualne parsery, równolegle na wszystkich rdzeniach.
+
+    Yields:
+        tuple: (wpis manifestu, wynik parsera) w kolejności pobrań
+    """
+    entries = archive.entries(kind, keywords=keywords, since=since)
+    chunks = [entries[i:i + REPARSE_CHUNK] for i in range(0, len(entries), REPARSE_CHUNK)]
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        # map zachowuje kolejność fragmentów, więc nowsze payloady są zapisywane później
+        for parsed in executor.map(_parse_chunk, [archive.root] * len(chunks), [kind] * len(chunks), chunks):
+            yield from parsed
+
+
+def backfill_storage(archive, storage_manager, group_name, keywords=None, since=None, workers=None):
+    """
+    Uzupełnia tabelę Offers{group_name} ofertami odtworzonymi z archiwum listingów.
+
+    Domyślnie tylko frazy, które dział już ma w swojej tabeli.
+    """
+    if not keywords:
+        existing = storage_manager.get_all_offers(group_name, select=["PartitionKey"])
+        keywords = sorted({e["PartitionKey"] for e in existing})
+        if not keywords:
+            print(f"Tabela Offers{group_name} jest pusta - podaj frazy przez --keyword")
+            return 0
+
+    total = 0
+    for entry, offers in reparse(archive, "listing", keywords=keywords, since=since, workers=workers):
+        # Bez autora: upsert MERGE zachowuje CreatedBy ofert już zapisanych przez użytkowników
+        storage_manager.save_offers(offers, group_name, None, scraped_at=entry["fetched_at"])
+        total += len(offers)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archiwum surowych payloadów __NEXT_DATA__")
+    parser.add_argument("command", choices=["stats", "reparse"])
+    parser.add_argument("--root", default=ARCHIVE_PATH)
+    parser.add_argument("--kind", choices=["listing", "offer"], default="listing")
+    parser.add_argument("--group", help="Dział, którego tabelę uzupełnić (tylko listingi)")
+    parser.add_argument("--keyword", action="append", help="Tylko wybrane frazy (można podać wiele razy)")
+    parser.add_argument("--since", help="Tylko pobrania od daty (ISO, np. 2026-01-01)")
+    parser.add_argument("--workers", type=int, help="Liczba procesów (domyślnie liczba rdzeni)")
+    parser.add_argument("--output", help="Plik JSONL z wynikami (gdy bez --group)")
+    args = parser.parse_args()
+
+    archive = RawArchive(args.root)
+    if args.command == "stats":
+        print(json.dumps(archive.stats(), indent=4))
+        return
+
+    if args.group and args.kind == "listing":
+        from dotenv import load_dotenv
+        from storage import AzureTableManager
+
+        load_dotenv()
+        storage_manager = AzureTableManager(os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
+        total = backfill_storage(archive, storage_manager, args.group, args.keyword, args.since, args.workers)
+        print(f"Uzupełniono Offers{args.group}: {total} ofert")
+        return
+
+    # Bez zapisu do bazy - wyniki parserów jako JSON Lines (np. do porównania ze starą wersją)
+    out = open(args.output, "w", encoding="utf-8") if args.output else None
+    count = 0
+    for entry, result in reparse(archive, args.kind, keywords=args.keyword, since=args.since, workers=args.workers):
+        line = json.dumps({"digest": entry["digest"], "url": entry["url"], "result": result}, ensure_ascii=False)
+        print(line, file=out) # out=None -> stdout
+        count += 1
+    if out:
+        out.close()
+        print(f"Zapisano {count} wyników do {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import gzip
+import json
+
+# --- KONFIGURACJA FORMATU ODPOWIEDZI ---
+# Typ MIME, którym frontend prosi o kolumnowy format wyników
+COLUMNAR_MIMETYPE = "application/vnd.pracuj.columnar+json"
+# Kolumna trafia do słownika, jeśli ma mniej unikalnych wartości niż ten ułamek wierszy
+DICTIONARY_RATIO = 0.5
+# Odpowiedzi mniejsze niż to nie są kompresowane (narzut gzip > zysk)
+MIN_COMPRESS_SIZE = 1024
+COMPRESS_LEVEL = 6
+
+
+def encode_columnar(rows, columns):
+    """
+    Zamienia listę słowników na format kolumnowy.
+
+    Nazwy kolumn występują raz w nagłówku, a kolumny z powtarzającymi się
+    wartościami (fraza, firma, wynagrodzenie...) są kodowane słownikiem:
+    w "data" są wtedy indeksy do listy w "dictionaries".
+
+    Returns:
+        dict: { "format", "length", "columns", "dictionaries", "data" }
+    """
+    data = {}
+    dictionaries = {}
+
+    for column in columns:
+        values = [row.get(column) for row in rows]
+        codes = {}
+        for value in values:
+            if value not in codes:
+                codes[value] = len(codes)
+
+        if len(codes) < DICTIONARY_RATIO * len(values):
+            dictionaries[column] = list(codes)
+            data[column] = [codes[value] for value in values]
+        else:
+            data[column] = values
+
+    return {
+        "format": "columnar",
+        "length": len(rows),
+        "columns": list(columns),
+        "dictionaries": dictionaries,
+        "data": data,
+    }
+
+
+def dumps_compact(payload):
+    """JSON bez zbędnych spacji i bez escapowania polskich znaków."""
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+
+def compress_response(response, accept_encoding):
+    """Kompresuje odpowiedź gzipem, jeśli klient to obsługuje i ma to sens."""
+    response.vary.add('Accept-Encoding')
+
+    if (
+        'gzip' not in (accept_encoding or '')
+        or response.status_code != 200
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+    ):
+        return response
+
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+
+    response.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    # Strong ETag opisuje konkretne bajty - po kompresji zmieniamy go na weak
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
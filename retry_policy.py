@@ -0,0 +1,203 @@
+import time
+import random
+import asyncio
+import threading
+import urllib.parse
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from fetch_pool import FETCH_POOL
+
+# --- KONFIGURACJA PONOWIEŃ ---
+RETRY_STATUSES = {403, 408, 425, 429, 500, 502, 503, 504} # Kody, przy których warto spróbować ponownie
+BREAKER_STATUSES = {403, 429, 500, 502, 503, 504}         # Kody liczone jako awaria hosta
+
+
+class RetryPolicy:
+    """
+    Reguły ponawiania zapytań: wykładniczy backoff z pełnym jitterem,
+    respektowanie Retry-After i łączny limit czasu (deadline).
+    """
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0, deadline=90.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline # Łączny czas (s) na jedną frazę / jedną ofertę
+
+    def backoff(self, attempt):
+        # Full jitter: losowo z przedziału [0, min(max, base * 2^próba)]
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def should_retry(self, status_code):
+        # status_code=None oznacza błąd sieci - też ponawiamy
+        return status_code is None or status_code in RETRY_STATUSES
+
+
+def parse_retry_after(value):
+    """Zwraca liczbę sekund z nagłówka Retry-After (sekundy albo data HTTP) lub None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Bezpiecznik dla jednego hosta.
+
+    Po serii awarii (failure_threshold w ciągu window sekund) otwiera się i od razu
+    odrzuca zapytania. Po open_duration przepuszcza jedno zapytanie próbne:
+    sukces zamyka bezpiecznik, porażka otwiera go ponownie.
+
+    Współdzielony przez pętle zdarzeń żądań Flask (osobne wątki) - stan chroni threading.Lock.
+    """
+
+    def __init__(self, failure_threshold=5, window=60.0, open_duration=60.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.open_duration = open_duration
+        self.clock = clock
+        self.state = "closed"
+        self.failures = []
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self.clock() - self.opened_at >= self.open_duration:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def retry_in(self):
+        """Za ile sekund bezpiecznik przepuści zapytanie próbne."""
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.open_duration - (self.clock() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = []
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            now = self.clock()
+            self.probe_in_flight = False
+            if self.state == "half_open":
+                self._open(now)
+                return
+            self.failures = [t for t in self.failures if now - t < self.window] + [now]
+            if len(self.failures) >= self.failure_threshold:
+                self._open(now)
+
+    def release_probe(self):
+        """Zapytanie próbne przerwane bez wyniku (np. anulowane) - następne zapytanie może spróbować."""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def _open(self, now):
+        print(f"  Bezpiecznik otwarty na {self.open_duration:.0f}s")
+        self.state = "open"
+        self.opened_at = now
+        self.failures = []
+
+
+# Wspólne bezpieczniki (po jednym na host) dla scrapera listingu i szczegółów ofert
+BREAKERS = {}
+BREAKERS_LOCK = threading.Lock()
+DEFAULT_POLICY = RetryPolicy()
+
+
+def get_breaker(url):
+    host = urllib.parse.urlsplit(url).netloc
+    if host not in BREAKERS:
+        with BREAKERS_LOCK:
+            if host not in BREAKERS:
+                BREAKERS[host] = CircuitBreaker()
+    return BREAKERS[host]
+
+
+async def fetch_with_retry(client, url, policy=DEFAULT_POLICY, deadline=None, fetch_pool=FETCH_POOL, before_attempt=None, **kwargs):
+    """
+    Pobiera URL zgodnie z polityką ponowień i bezpiecznikiem hosta.
+
+    Args:
+        client: Sesja curl_cffi (AsyncSession)
+        url: Adres do pobrania
+        policy: RetryPolicy
+        deadline: Moment (time.monotonic) po którym się poddajemy; domyślnie teraz + policy.deadline
+        before_attempt: Opcjonalna korutyna wywoływana przed każdą próbą (np. token z globalnego limitu zapytań)
+
+    Returns:
+        dict: { "ok", "response", "status", "error", "attempts", "url" }
+              error: None / "http_<kod>" / "network: ..." / "circuit_open" / "deadline"
+    """
+    if deadline is None:
+        deadline = time.monotonic() + policy.deadline
+    breaker = get_breaker(url)
+    outcome = {"ok": False, "response": None, "status": None, "error": None, "attempts": 0, "url": url}
+
+    for attempt in range(policy.max_attempts):
+        if before_attempt is not None:
+            await before_attempt()
+        if not breaker.allow():
+            outcome["error"] = "circuit_open"
+            return outcome
+
+        outcome["attempts"] = attempt + 1
+        retry_after = None
+        probe = breaker.state == "half_open"
+        try:
+            response = await fetch_pool.get(client, url, timeout=min(30, max(1.0, deadline - time.monotonic())), **kwargs)
+            outcome.update(response=response, status=response.status_code, error=None)
+        except Exception as e:
+            response = None
+            outcome.update(response=None, status=None, error=f"network: {e}")
+        except BaseException:
+            # Anulowane zapytanie próbne (CancelledError) nie może na zawsze zablokować bezpiecznika
+            if probe:
+                breaker.release_probe()
+            raise
+
+        status = outcome["status"]
+        if status is not None and status < 400:
+            breaker.record_success()
+            outcome["ok"] = True
+            return outcome
+
+        if status is None or status in BREAKER_STATUSES:
+            breaker.record_failure()
+        else:
+            # Błąd po stronie zapytania (np. 404) - host działa, ponawianie nic nie da
+            breaker.record_success()
+        if status is not None:
+            outcome["error"] = f"http_{status}"
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+        # Bezpiecznik właśnie się otworzył - nie czekamy na kolejną próbę, która i tak zostanie odrzucona
+        if not policy.should_retry(status) or attempt == policy.max_attempts - 1 or breaker.state == "open":
+            return outcome
+
+        # Opóźnienie: backoff, ale nie krócej niż Retry-After i kwarantanna całej puli profili
+        delay = max(policy.backoff(attempt), retry_after or 0.0, fetch_pool.cooldown_remaining())
+        if time.monotonic() + delay >= deadline:
+            outcome["error"] = "deadline"
+            return outcome
+        print(f"  {outcome['error']} dla {url} - ponowienie za {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    return outcome
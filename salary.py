@@ -0,0 +1,181 @@
+import threading
+import numpy as np
+import pandas as pd
+
+# --- KONFIGURACJA NORMALIZACJI ---
+# Mnożniki sprowadzające stawkę z danego okresu do kwoty miesięcznej
+PERIOD_TO_MONTH = {
+    'hour': 168,
+    'day': 21,
+    'week': 4.33,
+    'month': 1,
+    'year': 1 / 12,
+}
+CURRENCIES = {'zł': 'PLN', 'pln': 'PLN', '€': 'EUR', 'eur': 'EUR', '$': 'USD', 'usd': 'USD', '£': 'GBP', 'gbp': 'GBP', 'chf': 'CHF'}
+
+# Kolumny dodawane przez normalizator (nazwy zgodne z encjami w Azure Table Storage)
+SALARY_COLUMNS = ['SalaryMin', 'SalaryMax', 'SalaryCurrency', 'SalaryBasis', 'SalaryPeriod', 'SalaryMonthlyMin', 'SalaryMonthlyMax']
+DEFAULT_PERCENTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+# Liczba z separatorem tysięcy (spacja, twarda spacja) i opcjonalną częścią dziesiętną, np. "10 000,50"
+_NUMBER = r'\d[\d \u00a0\u202f]*(?:[.,]\d+)?'
+SALARY_PATTERN = rf'(?P<min>{_NUMBER})(?:\s*[–—-]\s*(?P<max>{_NUMBER}))?\s*(?P<currency>zł|pln|eur|€|usd|\$|gbp|£|chf)'
+
+# Pamięć podręczna sparsowanych napisów: { "tekst": (min, max, waluta, ...) }
+SALARY_CACHE = {}
+SALARY_CACHE_LIMIT = 200_000
+SALARY_CACHE_LOCK = threading.Lock() # Pamięć wspólna dla wątków zapisujących (potok zapisu)
+
+
+def _to_number(column):
+    cleaned = column.str.replace(r'[\s\u00a0\u202f]', '', regex=True).str.replace(',', '.', regex=False)
+    return pd.to_numeric(cleaned, errors='coerce').astype('float64')
+
+
+def _parse_unique(texts):
+    """Parsuje wektorowo listę unikalnych napisów z wynagrodzeniem."""
+    lowered = pd.Series(texts, dtype='object').str.lower()
+    extracted = lowered.str.extract(SALARY_PATTERN)
+
+    mins = _to_number(extracted['min'])
+    maxs = _to_number(extracted['max']).fillna(mins)
+    currency = extracted['currency'].map(CURRENCIES)
+
+    # Brutto/netto i okres rozliczeniowy (domyślnie miesiąc, jeśli podano kwotę)
+    basis = np.select(
+        [lowered.str.contains('brutto', regex=False).to_numpy(bool), lowered.str.contains('netto', regex=False).to_numpy(bool)],
+        ['gross', 'net'],
+        default=None,
+    )
+    period = np.select(
+        [
+            lowered.str.contains(r'godz|/\s*h\b', regex=True).to_numpy(bool),
+            lowered.str.contains(r'dzie[nń]|dniówk', regex=True).to_numpy(bool),
+            lowered.str.contains('tydz', regex=False).to_numpy(bool),
+            lowered.str.contains(r'\brok|roczn', regex=True).to_numpy(bool),
+        ],
+        ['hour', 'day', 'week', 'year'],
+        default='month',
+    )
+    period = pd.Series(period, index=lowered.index).where(mins.notna())
+    multiplier = period.map(PERIOD_TO_MONTH)
+
+    return pd.DataFrame({
+        'SalaryMin': mins,
+        'SalaryMax': maxs,
+        'SalaryCurrency': currency,
+        'SalaryBasis': pd.Series(basis, index=lowered.index).where(mins.notna()),
+        'SalaryPeriod': period,
+        'SalaryMonthlyMin': (mins * multiplier).round(2),
+        'SalaryMonthlyMax': (maxs * multiplier).round(2),
+    })
+
+
+def normalize_salaries(values):
+    """
+    Zamienia tablicę napisów z wynagrodzeniem (np. "10 000–14 000 zł brutto / mies.")
+    na kolumny liczbowe. Każdy unikalny napis jest parsowany tylko raz.
+
+    Args:
+        values: Lista / Series / tablica napisów (None i "Nie podano" dają puste wiersze)
+
+    Returns:
+        DataFrame: Kolumny SALARY_COLUMNS, po jednym wierszu na każdy element wejścia
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype='object'), use_na_sentinel=True)
+    uniques = list(uniques)
+
+    # 1. Parsujemy tylko napisy, których jeszcze nie ma w pamięci podręcznej
+    with SALARY_CACHE_LOCK:
+        rows = {text: SALARY_CACHE[text] for text in uniques if text in SALARY_CACHE}
+    missing = [text for text in uniques if text not in rows]
+    if missing:
+        parsed = dict(zip(missing, _parse_unique([str(text) for text in missing]).itertuples(index=False, name=None)))
+        rows.update(parsed)
+        with SALARY_CACHE_LOCK:
+            # Czyszczenie dopiero po odczycie - wynik tej paczki nie zależy od pamięci podręcznej
+            if len(SALARY_CACHE) + len(parsed) > SALARY_CACHE_LIMIT:
+                SALARY_CACHE.clear()
+            SALARY_CACHE.update(parsed)
+
+    # 2. Tabela unikalnych wartości + pusty wiersz dla brakujących danych (kod -1)
+    table = pd.DataFrame(
+        [rows[text] for text in uniques] + [(np.nan,) * len(SALARY_COLUMNS)],
+        columns=SALARY_COLUMNS,
+    )
+    codes = np.where(codes < 0, len(uniques), codes)
+
+    # 3. Rozwinięcie na wszystkie wiersze jednym indeksowaniem
+    return table.take(codes).reset_index(drop=True)
+
+
+def parse_salary(text):
+    """Wersja dla pojedynczego napisu - zwraca słownik bez pustych pól."""
+    row = normalize_salaries([text]).iloc[0].to_dict()
+    return {key: value for key, value in row.items() if not pd.isna(value)}
+
+
+def _prepare_frame(offers):
+    df = offers if isinstance(offers, pd.DataFrame) else pd.DataFrame(list(offers))
+    if df.empty:
+        return df
+
+    # Encje z Azure trzymają frazę w PartitionKey
+    if 'Keyword' not in df.columns and 'PartitionKey' in df.columns:
+        df = df.rename(columns={'PartitionKey': 'Keyword'})
+
+    # Surowy tekst jest źródłem prawdy (obejmuje też starsze encje bez kolumn liczbowych)
+    if 'Salary' in df.columns:
+        df = df.drop(columns=[c for c in SALARY_COLUMNS if c in df.columns]).reset_index(drop=True)
+        df = pd.concat([df, normalize_salaries(df['Salary'])], axis=1)
+    elif 'SalaryMonthlyMin' not in df.columns:
+        return df.iloc[0:0]
+
+    # Brak regionu w danych z listingu - przybliżamy go miastem z pola Location
+    if 'Region' not in df.columns and 'Location' in df.columns:
+        codes, locations = pd.factorize(df['Location'])
+        cities = pd.Series(locations, dtype='object').str.split(',', n=1).str[0].str.strip()
+        df['Region'] = pd.Series(cities.to_numpy(), dtype='object').reindex(codes).to_numpy()
+
+    return df
+
+
+def salary_percentiles(offers, dimensions=('Keyword', 'Region', 'PositionLevel'), percentiles=DEFAULT_PERCENTILES, currency='PLN', basis=None):
+    """
+    Liczy percentyle miesięcznego wynagrodzenia dla każdego wymiaru.
+
+    Dane są wczytywane i normalizowane raz, a następnie grupowane osobno
+    po każdym wymiarze. Wartością oferty jest środek widełek.
+
+    Args:
+        offers: Lista słowników (np. encje z Azure) lub DataFrame
+        dimensions: Kolumny, po których grupujemy (brakujące są pomijane)
+        percentiles: Kwantyle z przedziału 0-1
+        currency: Waluta, do której zawężamy dane (None = wszystkie)
+        basis: 'gross' / 'net' albo None (bez filtrowania)
+
+    Returns:
+        dict: { "wymiar": DataFrame z kolumnami count, p10, p25, ... }
+    """
+    df = _prepare_frame(offers)
+    if df.empty:
+        return {}
+
+    mask = df['SalaryMonthlyMin'].notna()
+    if currency:
+        mask &= df['SalaryCurrency'] == currency
+    if basis:
+        mask &= df['SalaryBasis'] == basis
+    df = df.loc[mask.fillna(False).astype(bool)]
+    values = (df['SalaryMonthlyMin'].astype('float64') + df['SalaryMonthlyMax'].astype('float64')) / 2
+
+    report = {}
+    for dimension in dimensions:
+        if dimension not in df.columns:
+            continue
+        grouped = values.groupby(df[dimension], sort=True)
+        stats = grouped.quantile(list(percentiles)).unstack()
+        stats.columns = [f"p{round(q * 100)}" for q in stats.columns]
+        stats.insert(0, 'count', grouped.size())
+        report[dimension] = stats
+    return report
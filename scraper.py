@@ -1,35 +1,77 @@
 import json
 import asyncio
 import urllib.parse
-import random
 import time
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
 from curl_cffi.requests import AsyncSession
+from fetch_pool import FETCH_POOL
+from retry_policy import fetch_with_retry, DEFAULT_POLICY
+from raw_archive import default_archive
+from payload_schema import decode_listing, record_drift, SchemaError
+from fair_scheduler import SCRAPE_SCHEDULER
 
 # --- KONFIGURACJA SYSTEMU ---
-# Globalny limit jednoczesnych zapytań do Pracuj.pl (wszyscy użytkownicy razem)
-SCRAPE_SEMAPHORE = asyncio.Semaphore(2) 
+# Globalny limit jednoczesnych zapytań do Pracuj.pl (wszyscy użytkownicy razem) jest w SCRAPE_SCHEDULER:
+# miejsca przydzielane sprawiedliwie między działy i użytkowników (fair_scheduler.py)
+
 # Pamięć podręczna: { "fraza": {"timestamp": data, "results": [...]} }
 SCRAPER_CACHE = {}
 CACHE_DURATION = timedelta(minutes=20) # Jak długo trzymać wyniki w pamięci
 
 class PracujScraper:
-    def __init__(self):
-        self.headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
-        "Accept-Language": "pl-PL,pl;q=0.9,en-US;q=0.8,en;q=0.7",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Upgrade-Insecure-Requests": "1",
-        "Sec-Fetch-Dest": "document",
-        "Sec-Fetch-Mode": "navigate",
-        "Sec-Fetch-Site": "none",
-        "Sec-Fetch-User": "?1",
-        "Cache-Control": "max-age=0",
-        }
-
-    def parse_data(self, json_data, search_term):
+    def __init__(self, fetch_pool=None, archive=None):
+        # Pula profili odcisku / proxy (nagłówki zgodne z profilem ustawia curl_cffi)
+        self.fetch_pool = fetch_pool or FETCH_POOL
+        # Archiwum surowych payloadów (RawArchive); None = domyślne, tworzone przy pierwszym zapisie
+        self.archive = archive
+
+    def parse_data(self, payload, search_term):
+        """
+        Parsuje __NEXT_DATA__ strony wyników.
+
+        Args:
+            payload: Surowy JSON (str/bytes - dekodowane są tylko potrzebne pola) albo słownik
+            search_term: Szukana fraza (zapisywana przy każdej ofercie)
+        """
+        try:
+            groups = decode_listing(payload)
+        except SchemaError as e:
+            # Zmiana struktury strony: liczymy ją i wracamy do tolerancyjnego parsera
+            record_drift("listing", e)
+            try:
+                json_data = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+            except ValueError as e:
+                print(f"Błąd parsowania: {e}")
+                return []
+            return self._parse_data_untyped(json_data, search_term)
+
+        parsed_offers = []
+        for group in groups:
+            salary = group.salaryDisplayText or "Nie podano"
+            position_level = ", ".join(group.positionLevels or [])
+
+            reqs = ""
+            if group.aiSummary:
+                soup_ai = BeautifulSoup(group.aiSummary, "html.parser")
+                reqs = " | ".join([li.get_text() for li in soup_ai.find_all('li')])
+
+            for offer in group.offers:
+                if offer.offerAbsoluteUri:
+                    parsed_offers.append({
+                        'Keyword': search_term,
+                        'Title': group.jobTitle,
+                        'Company': group.companyName,
+                        'Salary': salary,
+                        'PositionLevel': position_level,
+                        'Location': offer.displayWorkplace,
+                        'Link': offer.offerAbsoluteUri,
+                        'Requirements': reqs
+                    })
+        return parsed_offers
+
+    def _parse_data_untyped(self, json_data, search_term):
+        # Dotychczasowe, tolerancyjne przechodzenie po słownikach - używane, gdy payload nie pasuje do schematu
         parsed_offers = []
         try:
             queries = json_data.get('props', {}).get('pageProps', {}).get('dehydratedState', {}).get('queries', [])
@@ -42,6 +84,7 @@ class PracujScraper:
                     title = group.get('jobTitle')
                     company = group.get('companyName')
                     salary = group.get('salaryDisplayText') or "Nie podano"
+                    position_level = ", ".join(group.get('positionLevels') or [])
                     
                     ai_summary_raw = group.get('aiSummary', '')
                     reqs = ""
@@ -57,6 +100,7 @@ class PracujScraper:
                                 'Title': title,
                                 'Company': company,
                                 'Salary': salary,
+                                'PositionLevel': position_level,
                                 'Location': offer.get('displayWorkplace'),
                                 'Link': link,
                                 'Requirements': reqs
@@ -65,51 +109,96 @@ class PracujScraper:
             print(f"Błąd parsowania: {e}")
         return parsed_offers
 
-    async def scrape_keyword(self, client, keyword, max_pages=1):
+    async def fetch_page(self, client, keyword, page_num, policy=DEFAULT_POLICY, deadline=None, before_attempt=None):
+        """
+        Pobiera i parsuje jedną stronę wyników dla frazy.
+
+        before_attempt: korutyna przed każdą próbą pobrania (kolejka zadań pobiera w niej token limitu)
+
+        Returns:
+            tuple: (lista ofert, None) albo ([], słownik z opisem błędu)
+        """
+        url = f"https://www.pracuj.pl/praca/{urllib.parse.quote(keyword)};kw?pn={page_num}"
+        print(f"Szukanie: [{keyword}] (strona {page_num})")
+
+        outcome = await fetch_with_retry(
+            client, url, policy=policy, deadline=deadline, fetch_pool=self.fetch_pool, before_attempt=before_attempt
+        )
+        if not outcome['ok']:
+            print(f"  Nie udało się pobrać [{keyword}]: {outcome['error']}")
+            return [], {k: v for k, v in outcome.items() if k != 'response'}
+
+        soup = BeautifulSoup(outcome['response'].text, "html.parser")
+        script_tag = soup.find("script", id="__NEXT_DATA__")
+        if not script_tag:
+            return [], {'url': url, 'error': 'Nie znaleziono __NEXT_DATA__', 'status': outcome['status'], 'attempts': outcome['attempts']}
+
+        # Surowy payload trafia do archiwum (ponowne parsowanie bez pobierania)
+        await self.archive_payload(script_tag.string, "listing", url, keyword=keyword, page=page_num)
+        return self.parse_data(script_tag.string, keyword), None
+
+    async def archive_payload(self, raw, kind, url, keyword=None, page=None):
+        archive = self.archive or default_archive()
+        if archive is None:
+            return
+        try:
+            await asyncio.to_thread(archive.put, raw, kind, url, keyword=keyword, page=page)
+        except Exception as e:
+            # Błąd archiwum nie może przerwać scrapowania
+            print(f"Błąd zapisu do archiwum: {e}")
+
+    async def scrape_keyword(self, client, keyword, max_pages=1, policy=DEFAULT_POLICY, sink=None, group=None, user=None):
+        """
+        Pobiera oferty dla jednej frazy.
+
+        group, user: dział i użytkownik zlecający - według nich harmonogram przydziela
+                     miejsce na pobieranie (sprawiedliwie, a nie w kolejności zgłoszeń).
+
+        sink: opcjonalna korutyna (np. OfferWritePipeline.put) wywoływana z ofertami
+              każdej pobranej strony po zwolnieniu miejsca w harmonogramie - zapis
+              może trwać, zanim skończą się inne frazy.
+
+        Returns:
+            dict: { "keyword", "results": [...], "errors": [...], "from_cache": bool }
+                  errors zawiera wyniki nieudanych pobrań (fetch_with_retry) dla kolejnych stron
+        """
         # 1. Sprawdzenie Cache
         if keyword in SCRAPER_CACHE:
             cache_entry = SCRAPER_CACHE[keyword]
             if datetime.now() - cache_entry['timestamp'] < CACHE_DURATION:
                 print(f"--- Cache Hit dla: {keyword} ---")
-                return cache_entry['results']
+                if sink:
+                    await sink(cache_entry['results'])
+                return {'keyword': keyword, 'results': cache_entry['results'], 'errors': [], 'from_cache': True}
 
-        encoded_keyword = urllib.parse.quote(keyword)
         keyword_results = []
+        pages = []
+        errors = []
         
-        # 2. Użycie semafora - tylko ograniczona liczba zapytań naraz
-        async with SCRAPE_SEMAPHORE:
+        # 2. Miejsce w harmonogramie - tylko ograniczona liczba zapytań naraz, sprawiedliwie między działami
+        async with SCRAPE_SCHEDULER.slot(group, user):
+            # Łączny limit czasu na frazę (wszystkie strony i ponowienia razem)
+            deadline = time.monotonic() + policy.deadline
             for page_num in range(1, max_pages + 1):
-                url = f"https://www.pracuj.pl/praca/{encoded_keyword};kw?pn={page_num}"
-                
-                # 3. Mechanizm Retry (maksymalnie 3 próby na stronę)
-                for attempt in range(3):
-                    try:
-                        print(f"Szukanie: [{keyword}] (Próba {attempt+1})")
-                        response = await client.get(url, impersonate="chrome110", timeout=30)
-                        
-                        if response.status_code == 200:
-                            soup = BeautifulSoup(response.text, "html.parser")
-                            script_tag = soup.find("script", id="__NEXT_DATA__")
-                            if script_tag:
-                                results = self.parse_data(json.loads(script_tag.string), keyword)
-                                keyword_results.extend(results)
-                                break # Sukces, wychodzimy z pętli prób
-                        
-                        elif response.status_code == 403:
-                            print(f"  Blokada 403 dla {keyword}. Czekam przed ponowieniem...")
-                            await asyncio.sleep(random.uniform(5, 10)) # Dłuższy sleep po 403
-                        
-                    except Exception as e:
-                        print(f"  Błąd sieciowy: {e}")
-                    
-                    # Losowe opóźnienie (Jitter) między próbami
-                    await asyncio.sleep(random.uniform(1, 3))
+                # 3. Pobranie z ponowieniami (backoff, Retry-After, bezpiecznik hosta)
+                results, error = await self.fetch_page(client, keyword, page_num, policy=policy, deadline=deadline)
+                if error:
+                    errors.append(error)
+                    break
+                keyword_results.extend(results)
+                pages.append(results)
+
+        if sink:
+            # Przekazanie do zapisu dopiero po zwolnieniu miejsca: czekanie na pełną kolejkę
+            # zapisu (backpressure) nie blokuje pobierania innym działom
+            for results in pages:
+                await sink(results)
 
-        # 4. Zapis do Cache po pobraniu danych
-        if keyword_results:
+        # 4. Zapis do Cache po pobraniu danych (tylko kompletne wyniki)
+        if keyword_results and not errors:
             SCRAPER_CACHE[keyword] = {
                 'timestamp': datetime.now(),
                 'results': keyword_results
             }
         
-        return keyword_results
\ No newline at end of file
+        return {'keyword': keyword, 'results': keyword_results, 'errors': errors, 'from_cache': False}
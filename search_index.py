@@ -0,0 +1,219 @@
+import os
+import re
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+
+# --- KONFIGURACJA INDEKSU ---
+# Wagi kolumn w rankingu bm25 (tytuł ważniejszy niż firma i wymagania)
+COLUMN_WEIGHTS = (10.0, 4.0, 1.0)
+# Tokenizer FTS5 (remove_diacritics) zdejmuje ogonki z ą, ć, ę, ń, ó, ś, ź, ż,
+# ale "ł" nie ma rozkładu w Unicode - zamieniamy ją sami przed indeksowaniem
+POLISH_FOLDING = str.maketrans({'ł': 'l', 'Ł': 'L'})
+TOKEN_PATTERN = re.compile(r'\w+')
+# Co ile indeks dociąga z Azure oferty zapisane przez inne instancje (przy wyszukiwaniu)
+SYNC_INTERVAL = timedelta(seconds=float(os.getenv("SEARCH_INDEX_SYNC_SECONDS", "300")))
+SYNC_OVERLAP = timedelta(minutes=2) # Zapas na różnice zegarów przy pobieraniu zmian od ostatniej synchronizacji
+
+
+def fold_text(text):
+    """Przygotowuje tekst dla indeksu ("Łódź" -> "Lódź", resztę załatwia tokenizer)."""
+    if not text:
+        return ""
+    return str(text).translate(POLISH_FOLDING)
+
+
+def build_match_query(query):
+    """Zamienia wpisaną frazę na zapytanie FTS5 (każde słowo jako prefiks, łączone AND)."""
+    tokens = TOKEN_PATTERN.findall(fold_text(query))
+    return " AND ".join(f'"{token}"*' for token in tokens)
+
+
+def _offer_id(group_name, row_key):
+    # Stabilne 60-bitowe id wiersza, wspólne dla tabeli ofert i indeksu FTS
+    return int(hashlib.md5(f"{group_name}:{row_key}".encode()).hexdigest()[:15], 16)
+
+
+class OfferSearchIndex:
+    """
+    Lokalny indeks pełnotekstowy (SQLite FTS5) nad tytułami, firmami i wymaganiami.
+    Aktualizowany przyrostowo przy każdym zapisie ofert.
+
+    Plik indeksu jest lokalny dla instancji (SEARCH_INDEX_PATH): SQLite w trybie WAL
+    nie nadaje się na dysk współdzielony przez kilka instancji App Service. Oferty
+    zapisane przez inne instancje (i historia sprzed wdrożenia) trafiają do indeksu
+    przez sync_from_storage - przy pierwszym wyszukiwaniu działu pełne zasilenie,
+    potem co SYNC_INTERVAL tylko zmiany z Azure.
+    """
+
+    def __init__(self, path="search_index.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock() # Jedna synchronizacja naraz - pozostałe żądania czekają na jej wynik
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS offers (
+                    id INTEGER PRIMARY KEY,
+                    group_name TEXT NOT NULL,
+                    row_key TEXT NOT NULL,
+                    keyword TEXT,
+                    title TEXT,
+                    company TEXT,
+                    location TEXT,
+                    salary TEXT,
+                    link TEXT,
+                    requirements TEXT,
+                    scraped_at TEXT
+                )
+            """)
+            # Wielkość liter i znaki diakrytyczne (poza "ł") normalizuje tokenizer, także w zapytaniach
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS offers_fts USING fts5(
+                    title, company, requirements,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS index_sync (
+                    group_name TEXT PRIMARY KEY,
+                    synced_at TEXT NOT NULL
+                )
+            """)
+
+    def add_offers(self, offers, group_name):
+        """
+        Dodaje lub aktualizuje oferty w indeksie (klucz jak w Azure: hash z linku).
+
+        Args:
+            offers: Lista słowników w formacie PracujScraper.parse_data
+            group_name: Dział, do którego należą oferty
+        """
+        if not offers:
+            return
+
+        scraped_at = datetime.utcnow().isoformat()
+        rows = {}
+        for offer in offers:
+            row_key = hashlib.md5(offer['Link'].encode()).hexdigest()
+            offer_id = _offer_id(group_name, row_key)
+            # Ten sam link pod kilkoma frazami: jeden wiersz na ofertę (wygrywa ostatni), inaczej FTS odrzuci paczkę
+            rows[offer_id] = (
+                offer_id, group_name, row_key, offer.get('Keyword'), offer.get('Title'),
+                offer.get('Company'), offer.get('Location'), offer.get('Salary'), offer['Link'],
+                offer.get('Requirements'), offer.get('ScrapedAt', scraped_at),
+            )
+        rows = list(rows.values())
+
+        with self._lock, self._conn:
+            # Stare wersje ofert usuwamy z indeksu FTS, a tabelę ofert nadpisujemy
+            self._conn.executemany("DELETE FROM offers_fts WHERE rowid = ?", [(row[0],) for row in rows])
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO offers (id, group_name, row_key, keyword, title, company, location, salary, link, requirements, scraped_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            self._conn.executemany(
+                "INSERT INTO offers_fts (rowid, title, company, requirements) VALUES (?, ?, ?, ?)",
+                [(row[0], fold_text(row[4]), fold_text(row[5]), fold_text(row[9])) for row in rows],
+            )
+
+    def search(self, query, group_name, limit=50):
+        """
+        Wyszukuje oferty działu, posortowane według trafności (bm25).
+
+        Returns:
+            list: Słowniki z polami oferty i wartością "score" (niższa = lepsza)
+        """
+        match_query = build_match_query(query)
+        if not match_query:
+            return []
+
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT o.keyword, o.title, o.company, o.location, o.salary, o.link, o.requirements, o.scraped_at,
+                       bm25(offers_fts, {', '.join(map(str, COLUMN_WEIGHTS))}) AS score
+                FROM offers_fts
+                JOIN offers o ON o.id = offers_fts.rowid
+                WHERE offers_fts MATCH ? AND o.group_name = ?
+                ORDER BY score
+                LIMIT ?
+            """, (match_query, group_name, limit)).fetchall()
+
+        return [dict(row) for row in rows]
+
+    def rebuild_from_storage(self, storage_manager, group_name):
+        """Pełne zasilenie indeksu całą historią działu z Azure Table Storage."""
+        return self._load_from_storage(storage_manager, group_name, since=None)
+
+    def sync_from_storage(self, storage_manager, group_name, max_age=SYNC_INTERVAL):
+        """
+        Dociąga oferty działu z Azure, jeśli indeks nie był synchronizowany od max_age.
+
+        Pierwszy raz (pusty indeks instancji) - cała historia, potem tylko encje
+        zmienione od ostatniej synchronizacji (Timestamp Azure).
+
+        Returns:
+            int: Liczba zaindeksowanych ofert (0, jeśli indeks był aktualny)
+        """
+        with self._sync_lock:
+            with self._lock:
+                row = self._conn.execute("SELECT synced_at FROM index_sync WHERE group_name = ?", (group_name,)).fetchone()
+            synced_at = datetime.fromisoformat(row["synced_at"]) if row else None
+            if synced_at and datetime.now(timezone.utc) - synced_at < max_age:
+                return 0
+            return self._load_from_storage(storage_manager, group_name, since=synced_at - SYNC_OVERLAP if synced_at else None)
+
+    def _load_from_storage(self, storage_manager, group_name, since=None):
+        started_at = datetime.now(timezone.utc)
+        # strict: przy błędzie Azure nie zapisujemy synchronizacji - kolejne wyszukiwanie spróbuje ponownie
+        entities = storage_manager.get_all_offers(group_name, since=since, strict=True)
+        offers = [
+            {
+                'Keyword': e.get('PartitionKey'),
+                'Title': e.get('Title'),
+                'Company': e.get('Company'),
+                'Location': e.get('Location'),
+                'Salary': e.get('Salary'),
+                'Link': e.get('Link'),
+                'Requirements': e.get('Requirements'),
+                'ScrapedAt': e.get('ScrapedAt'),
+            }
+            for e in entities if e.get('Link')
+        ]
+        self.add_offers(offers, group_name)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO index_sync (group_name, synced_at) VALUES (?, ?)",
+                (group_name, started_at.isoformat())
+            )
+        return len(offers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indeks wyszukiwania ofert (SQLite FTS5)")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--group", required=True, action="append", help="Dział (można podać wiele razy)")
+    parser.add_argument("--path", default=os.getenv("SEARCH_INDEX_PATH", "search_index.db"))
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from storage import AzureTableManager
+
+    load_dotenv()
+    index = OfferSearchIndex(args.path)
+    storage_manager = AzureTableManager(os.getenv("AZURE_STORAGE_CONNECTION_STRING"))
+    for group_name in args.group:
+        print(f"Offers{group_name}: zaindeksowano {index.rebuild_from_storage(storage_manager, group_name)} ofert")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+// Generowanie CSV poza wątkiem UI - wynik wysyłany w częściach (Blob parts)
+const CHUNK_ROWS = 2000;
+
+function csvValue(value) {
+    return `"${(value ?? '').toString().replace(/"/g, '""')}"`;
+}
+
+self.onmessage = (event) => {
+    const { headers, rows } = event.data;
+
+    self.postMessage({ type: 'chunk', part: headers.join(',') });
+
+    for (let start = 0; start < rows.length; start += CHUNK_ROWS) {
+        const lines = [];
+        const end = Math.min(rows.length, start + CHUNK_ROWS);
+        for (let i = start; i < end; i++) {
+            lines.push('\n' + rows[i].map(csvValue).join(','));
+        }
+        self.postMessage({ type: 'chunk', part: lines.join('') });
+    }
+
+    self.postMessage({ type: 'done' });
+};
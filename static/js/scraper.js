@@ -1,7 +1,20 @@
 // --- KONFIGURACJA LIMITÓW ---
 const MAX_KEYWORDS = 20; // Maksymalna liczba fraz na jedno zapytanie
 
+// --- KONFIGURACJA TABELI ---
+const ROW_HEIGHT = 56;      // Stała wysokość wiersza (px) - wymagana przez wirtualne przewijanie
+const OVERSCAN_ROWS = 10;   // Dodatkowe wiersze renderowane nad i pod widocznym obszarem
+const CSV_HEADERS = ['Szukana fraza', 'Stanowisko', 'Firma', 'Wynagrodzenie', 'Lokalizacja', 'Link', 'Wymagania (AI)'];
+const COLUMNAR_MIMETYPE = 'application/vnd.pracuj.columnar+json';
+const SCRIPT_BASE = document.currentScript ? document.currentScript.src.replace(/[^/]*$/, '') : '/static/js/';
+
 let scrapedData = [];
+let searchKeys = [];   // Znormalizowany tekst każdego wiersza (do filtrowania)
+let viewIndex = [];    // Indeksy wierszy scrapedData po filtrze i sortowaniu
+let sortState = { key: null, direction: 1 };
+let renderScheduled = false;
+
+const collator = new Intl.Collator('pl', { sensitivity: 'base', numeric: true });
 
 async function startScraping() {
     const textarea = document.getElementById('keywords');
@@ -33,15 +46,27 @@ async function startScraping() {
     try {
         const response = await fetch('/scrape', {
             method: 'POST',
-            headers: {'Content-Type': 'application/json'},
+            headers: {
+                'Content-Type': 'application/json',
+                // Preferujemy kompaktowy format kolumnowy; zwykły JSON nadal jest akceptowany
+                'Accept': `${COLUMNAR_MIMETYPE}, application/json;q=0.5`
+            },
             // Przesyłamy już przefiltrowaną listę (jako string z nowymi liniami)
             body: JSON.stringify({ keywords: keywordList.join('\n') })
         });
-        
+
         if (!response.ok) throw new Error("Server Error");
 
-        scrapedData = await response.json();
+        const payload = await response.json();
+        setData(decodeResults(payload));
         renderTable();
+
+        // Frazy, których serwer nie zdołał pobrać (blokada, limit czasu); przy zwykłym JSON-ie - w nagłówku
+        const errors = payload.errors || JSON.parse(response.headers.get('X-Failed-Keywords') || '[]');
+        if (errors.length > 0) {
+            const failed = errors.map(e => `• ${e.keyword} (${e.error})`).join('\n');
+            alert(`⚠️ Nie udało się pobrać wyników dla części fraz:\n${failed}`);
+        }
     } catch (e) {
         console.error("Scraping error:", e);
         alert("❌ Wystąpił błąd podczas pobierania danych. Spróbuj ponownie za chwilę.");
@@ -51,51 +76,132 @@ async function startScraping() {
     }
 }
 
-function renderTable() {
-    const container = document.getElementById('results-container');
+// Odtwarza listę obiektów z formatu kolumnowego (kolumny słownikowe zawierają indeksy)
+function decodeResults(payload) {
+    if (Array.isArray(payload)) return payload;
+
+    const { length, columns, dictionaries, data } = payload;
+    const rows = new Array(length);
+    for (let i = 0; i < length; i++) rows[i] = {};
+
+    for (const column of columns) {
+        const values = data[column];
+        const dictionary = dictionaries[column];
+        if (dictionary) {
+            for (let i = 0; i < length; i++) rows[i][column] = dictionary[values[i]];
+        } else {
+            for (let i = 0; i < length; i++) rows[i][column] = values[i];
+        }
+    }
+    return rows;
+}
+
+function escapeHtml(value) {
+    return (value ?? '').toString()
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;');
+}
+
+// Jednorazowe przygotowanie indeksu po otrzymaniu danych
+function setData(data) {
+    scrapedData = data;
+    searchKeys = scrapedData.map(item =>
+        [item['Stanowisko'], item['Firma'], item['Lokalizacja'], item['Wynagrodzenie'], item['Szukana fraza']]
+            .join(' ')
+            .toLocaleLowerCase('pl')
+    );
+    sortState = { key: null, direction: 1 };
+    document.getElementById('results-filter').value = '';
+    applyView();
+}
+
+// Filtr i sortowanie działają na tablicy indeksów - same dane nie są kopiowane
+function applyView() {
+    const query = document.getElementById('results-filter').value.trim().toLocaleLowerCase('pl');
+    const indices = [];
+    for (let i = 0; i < scrapedData.length; i++) {
+        if (!query || searchKeys[i].includes(query)) indices.push(i);
+    }
+
+    if (sortState.key) {
+        const { key, direction } = sortState;
+        indices.sort((a, b) => direction * collator.compare(scrapedData[a][key] || '', scrapedData[b][key] || ''));
+    }
+
+    viewIndex = indices;
+    document.getElementById('count').innerText = query
+        ? `${viewIndex.length} / ${scrapedData.length}`
+        : scrapedData.length;
+}
+
+function sortBy(key) {
+    sortState = sortState.key === key
+        ? { key, direction: -sortState.direction }
+        : { key, direction: 1 };
+    applyView();
+    document.getElementById('results-scroll').scrollTop = 0;
+    renderRows();
+}
+
+function filterResults() {
+    applyView();
+    document.getElementById('results-scroll').scrollTop = 0;
+    renderRows();
+}
+
+function buildRow(item) {
+    return `<tr class="hover:bg-slate-800/50 transition-colors border-b border-slate-800/50" style="height:${ROW_HEIGHT}px">`
+        + `<td class="px-4 font-medium text-blue-400 truncate max-w-xs"><a href="${escapeHtml(item['Link'])}" target="_blank" class="hover:underline">${escapeHtml(item['Stanowisko'])}</a></td>`
+        + `<td class="px-4 text-slate-300 truncate max-w-xs">${escapeHtml(item['Firma'])}</td>`
+        + `<td class="px-4 text-slate-400 text-sm truncate max-w-xs">${escapeHtml(item['Lokalizacja'])}</td>`
+        + `<td class="px-4 text-emerald-400 font-mono text-sm whitespace-nowrap">${escapeHtml(item['Wynagrodzenie'])}</td>`
+        + `</tr>`;
+}
+
+// Renderuje tylko wiersze w widocznym oknie (+ zapas); resztę zastępują puste wiersze-odstępniki
+function renderRows() {
+    renderScheduled = false;
+    const scroller = document.getElementById('results-scroll');
     const tbody = document.getElementById('results-body');
-    const count = document.getElementById('count');
-    
-    tbody.innerHTML = '';
-    
-    if (scrapedData.length === 0) {
+
+    if (viewIndex.length === 0) {
         tbody.innerHTML = `<tr><td colspan="4" class="p-8 text-center text-slate-500 italic">Nie znaleziono żadnych ofert dla podanych fraz.</td></tr>`;
-    } else {
-        scrapedData.forEach(item => {
-            const row = `
-                <tr class="hover:bg-slate-800/50 transition-colors border-b border-slate-800/50">
-                    <td class="p-4 font-medium text-blue-400">
-                        <a href="${item['Link']}" target="_blank" class="hover:underline">${item['Stanowisko']}</a>
-                    </td>
-                    <td class="p-4 text-slate-300">${item['Firma']}</td>
-                    <td class="p-4 text-slate-400 text-sm">${item['Lokalizacja']}</td>
-                    <td class="p-4 text-emerald-400 font-mono text-sm">${item['Wynagrodzenie']}</td>
-                </tr>
-            `;
-            tbody.innerHTML += row;
-        });
+        return;
     }
 
-    count.innerText = scrapedData.length;
+    const visibleRows = Math.ceil(scroller.clientHeight / ROW_HEIGHT) || 20;
+    const start = Math.max(0, Math.floor(scroller.scrollTop / ROW_HEIGHT) - OVERSCAN_ROWS);
+    const end = Math.min(viewIndex.length, start + visibleRows + 2 * OVERSCAN_ROWS);
+
+    const parts = [];
+    if (start > 0) parts.push(`<tr style="height:${start * ROW_HEIGHT}px"></tr>`);
+    for (let i = start; i < end; i++) parts.push(buildRow(scrapedData[viewIndex[i]]));
+    if (end < viewIndex.length) parts.push(`<tr style="height:${(viewIndex.length - end) * ROW_HEIGHT}px"></tr>`);
+
+    // Jedno przypisanie = jedno parsowanie HTML na klatkę
+    tbody.innerHTML = parts.join('');
+}
+
+function onResultsScroll() {
+    if (renderScheduled) return;
+    renderScheduled = true;
+    requestAnimationFrame(renderRows);
+}
+
+function renderTable() {
+    const container = document.getElementById('results-container');
+
     container.classList.remove('hidden');
+    document.getElementById('results-scroll').scrollTop = 0;
+    renderRows();
     // Scroll do wyników
     container.scrollIntoView({ behavior: 'smooth', block: 'start' });
 }
 
-function downloadCSV() {
-    if (scrapedData.length === 0) return;
-
-    const headers = ['Szukana fraza', 'Stanowisko', 'Firma', 'Wynagrodzenie', 'Lokalizacja', 'Link', 'Wymagania (AI)'];
-    
-    // Tworzenie treści CSV z obsługą cudzysłowów
-    const csvContent = [
-        headers.join(','),
-        ...scrapedData.map(row => 
-            headers.map(h => `"${(row[h] || '').toString().replace(/"/g, '""')}"`).join(',')
-        )
-    ].join('\n');
-
-    const blob = new Blob(["\ufeff" + csvContent], { type: 'text/csv;charset=utf-8;' });
+function saveBlob(parts) {
+    const blob = new Blob(parts, { type: 'text/csv;charset=utf-8;' });
     const url = URL.createObjectURL(blob);
     const link = document.createElement("a");
     link.href = url;
@@ -103,13 +209,49 @@ function downloadCSV() {
     document.body.appendChild(link);
     link.click();
     document.body.removeChild(link);
+    setTimeout(() => URL.revokeObjectURL(url), 1000);
+}
+
+function downloadCSV() {
+    if (scrapedData.length === 0) return;
+
+    // Eksport w kolejności widoku (po sortowaniu), zawsze wszystkie wiersze
+    const rows = (viewIndex.length === scrapedData.length ? viewIndex : scrapedData.map((_, i) => i))
+        .map(i => CSV_HEADERS.map(h => scrapedData[i][h]));
+
+    // Budowanie CSV w Web Workerze - części pliku trafiają prosto do Bloba
+    if (!window.Worker) {
+        saveBlob(["\ufeff", CSV_HEADERS.join(','), ...rows.map(r => '\n' + r.map(v => `"${(v || '').toString().replace(/"/g, '""')}"`).join(','))]);
+        clearResults();
+        return;
+    }
 
-    clearResults();
+    const worker = new Worker(SCRIPT_BASE + 'csv-worker.js');
+    const parts = ["\ufeff"];
+    worker.onmessage = (event) => {
+        const message = event.data;
+        if (message.type === 'chunk') {
+            parts.push(message.part);
+        } else if (message.type === 'done') {
+            worker.terminate();
+            saveBlob(parts);
+            clearResults();
+        }
+    };
+    worker.onerror = (e) => {
+        console.error("CSV worker error:", e);
+        worker.terminate();
+        alert("❌ Nie udało się wygenerować pliku CSV.");
+    };
+    worker.postMessage({ headers: CSV_HEADERS, rows });
 }
 
 function clearResults() {
     scrapedData = [];
+    searchKeys = [];
+    viewIndex = [];
+    document.getElementById('results-body').innerHTML = '';
     document.getElementById('results-container').classList.add('hidden');
     document.getElementById('keywords').value = '';
     window.scrollTo({ top: 0, behavior: 'smooth' });
-}
\ No newline at end of file
+}
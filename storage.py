@@ -1,33 +1,52 @@
 import os
-from azure.data.tables import TableClient, UpdateMode
+import asyncio
+from azure.data.tables import TableServiceClient, UpdateMode
 from azure.core.exceptions import ResourceNotFoundError
 from datetime import datetime
 import hashlib
+import pandas as pd
+from salary import normalize_salaries
+
+TRANSACTION_SIZE = 100 # Limit operacji w jednej transakcji wsadowej Azure Tables (jedna partycja)
 
 class AzureTableManager:
-    def __init__(self, connection_string):
+    def __init__(self, connection_string, search_index=None):
         self.connection_string = connection_string
+        # Opcjonalny lokalny indeks pełnotekstowy (OfferSearchIndex), aktualizowany przy zapisie
+        self.search_index = search_index
+        # Klienci tworzeni przy pierwszym użyciu i współdzieleni (jedna pula połączeń HTTP)
+        self._service = None
+        self._clients = {}
+        self._created_tables = set() # Tabele już utworzone (sprawdzone) w tym procesie
+
+    @property
+    def service(self):
+        if self._service is None:
+            self._service = TableServiceClient.from_connection_string(self.connection_string)
+        return self._service
 
     def _get_client(self, table_name):
-        # Automatyczne tworzenie tabeli, jeśli nie istnieje
-        client = TableClient.from_connection_string(self.connection_string, table_name=table_name)
-        try:
-            client.create_table()
-        except:
-            pass
-        return client
+        # Automatyczne tworzenie tabeli, jeśli nie istnieje (tylko raz na proces)
+        if table_name not in self._clients:
+            client = self.service.get_table_client(table_name)
+            try:
+                client.create_table()
+            except:
+                pass
+            self._created_tables.add(table_name)
+            self._clients[table_name] = client
+        return self._clients[table_name]
 
-    def save_offers(self, offers, group_name, user_email):
-        """
-        Zapisuje oferty do tabeli przypisanej do grupy (np. 'OffersHR' lub 'OffersSales').
-        """
-        if not offers:
-            return
-            
-        table_name = f"Offers{group_name}"
-        client = self._get_client(table_name)
+    def warm_up(self):
+        """Otwiera połączenie z Azure Table Storage (DNS + TLS) przed pierwszym zapytaniem użytkownika."""
+        next(iter(self.service.list_tables(results_per_page=1)), None)
+
+    def _build_entities(self, offers, user_email, scraped_at=None):
+        # Normalizacja wynagrodzeń dla całej paczki naraz (kolumny liczbowe do analiz)
+        salaries = normalize_salaries([offer['Salary'] for offer in offers]).to_dict('records')
+        entities = {}
         
-        for offer in offers:
+        for offer, salary in zip(offers, salaries):
             # PartitionKey: Słowo kluczowe
             # RowKey: Hash z linku (musi być unikalny i nie może mieć znaków specjalnych)
             row_key = hashlib.md5(offer['Link'].encode()).hexdigest()
@@ -41,34 +60,132 @@ class AzureTableManager:
                 "Location": offer['Location'],
                 "Link": offer['Link'],
                 "Requirements": offer['Requirements'],
-                "ScrapedAt": datetime.utcnow().isoformat(),
-                "CreatedBy": user_email
+                "PositionLevel": offer.get('PositionLevel', ''),
+                "ScrapedAt": scraped_at or datetime.utcnow().isoformat(),
             }
+            if user_email is not None:
+                # Odtwarzanie z archiwum (user_email=None) nie nadpisuje autora istniejących ofert
+                entity["CreatedBy"] = user_email
+            # Azure Table Storage nie przyjmuje pustych wartości - pomijamy brakujące pola
+            entity.update({key: value for key, value in salary.items() if not pd.isna(value)})
+            if scraped_at is None:
+                # Oferta widoczna w wynikach wyszukiwania - na pewno aktywna (także po wcześniejszym wygaśnięciu)
+                entity["IsActive"] = True
+            # Ten sam link dwa razy w jednej transakcji to błąd - zostaje ostatnia wersja
+            entities[(entity["PartitionKey"], row_key)] = entity
+
+        return list(entities.values())
+
+    def _transactions(self, entities, operation="upsert"):
+        """Dzieli encje na transakcje: jedna partycja (fraza) i maks. TRANSACTION_SIZE operacji."""
+        partitions = {}
+        for entity in entities:
+            partitions.setdefault(entity["PartitionKey"], []).append(entity)
+        for partition in partitions.values():
+            for start in range(0, len(partition), TRANSACTION_SIZE):
+                # Upsert (Update or Insert) albo update (tylko istniejące encje)
+                yield [(operation, entity, {"mode": UpdateMode.MERGE}) for entity in partition[start:start + TRANSACTION_SIZE]]
+
+    def _update_search_index(self, offers, group_name):
+        # Przyrostowa aktualizacja indeksu wyszukiwania (błąd indeksu nie blokuje zapisu)
+        if self.search_index is not None:
+            try:
+                self.search_index.add_offers(offers, group_name)
+            except Exception as e:
+                print(f"Błąd aktualizacji indeksu wyszukiwania: {e}")
+
+    def save_offers(self, offers, group_name, user_email, scraped_at=None):
+        """
+        Zapisuje oferty do tabeli przypisanej do grupy (np. 'OffersHR' lub 'OffersSales').
+        scraped_at: czas pobrania (ISO) przy odtwarzaniu z archiwum; domyślnie teraz.
+        user_email: autor (CreatedBy); None przy odtwarzaniu z archiwum - zostaje dotychczasowy.
+        """
+        if not offers:
+            return
             
-            # Upsert (Update or Insert)
-            client.upsert_entity(mode=UpdateMode.MERGE, entity=entity)
+        table_name = f"Offers{group_name}"
+        client = self._get_client(table_name)
 
-    # def get_all_offers(self, group_name):
-    #     """Pobiera wszystkie historyczne oferty dla danej grupy."""
-    #     table_name = f"Offers{group_name}"
-    #     client = TableClient.from_connection_string(self.connection_string, table_name=table_name)
-        
-    #     try:
-    #         # Pobieramy wszystkie encje z tabeli
-    #         entities = client.query_entities(query_filter="")
-    #         return list(entities)
-    #     except Exception as e:
-    #         print(f"Błąd podczas pobierania danych: {e}")
-    #         return []
-    def get_offers_paginated(self, group_name, results_per_page=100, offset_token=None):
+        # Transakcje wsadowe zamiast osobnego zapytania na każdą ofertę
+        for operations in self._transactions(self._build_entities(offers, user_email, scraped_at)):
+            client.submit_transaction(operations)
+
+        self._update_search_index(offers, group_name)
+
+    def merge_offers(self, group_name, updates):
+        """
+        Aktualizuje wybrane pola istniejących ofert (MERGE) transakcjami wsadowymi.
+
+        Args:
+            updates: Lista słowników z PartitionKey, RowKey i zmienianymi polami
+
+        Returns:
+            int: Liczba zaktualizowanych encji
+        """
+        client = self._get_client(f"Offers{group_name}")
+        updated = 0
+        for operations in self._transactions(updates, operation="update"):
+            try:
+                client.submit_transaction(operations)
+                updated += len(operations)
+            except Exception as e:
+                # Transakcja przepada w całości (np. ktoś usunął jedną ofertę) - ponawiamy pojedynczo
+                print(f"Transakcja aktualizacji nieudana ({e}) - zapis pojedynczy")
+                for _, entity, _ in operations:
+                    try:
+                        client.update_entity(entity, mode=UpdateMode.MERGE)
+                        updated += 1
+                    except ResourceNotFoundError:
+                        pass
+        return updated
+
+    async def save_offers_async(self, offers, group_name, user_email, scraped_at=None):
+        """
+        save_offers w wątku - nie blokuje pętli zdarzeń podczas zapisu.
+
+        Klient synchroniczny (wspólny transport) jest bezpieczny dla wielu wątków, więc
+        równoległość zapisu zapewnia liczba zadań zapisujących w OfferWritePipeline.
+        """
+        if offers:
+            await asyncio.to_thread(self.save_offers, offers, group_name, user_email, scraped_at)
+
+    def get_all_offers(self, group_name, select=None, since=None, strict=False):
+        """
+        Pobiera wszystkie historyczne oferty dla danej grupy.
+
+        Args:
+            group_name: Nazwa działu (tabela Offers{group_name})
+            select: Lista kolumn do pobrania (mniej danych z Azure przy analizach)
+            since: Tylko encje zmienione od tej chwili (datetime, systemowe pole Timestamp)
+            strict: Błąd Azure jest zgłaszany zamiast zwracania pustej listy
+        """
+        table_name = f"Offers{group_name}"
+        client = self._get_client(table_name)
+
+        try:
+            if since is not None:
+                entities = client.query_entities(
+                    query_filter="Timestamp ge @since", parameters={"since": since}, select=select, results_per_page=1000
+                )
+            else:
+                entities = client.query_entities(query_filter="", select=select, results_per_page=1000)
+            return list(entities)
+        except Exception as e:
+            print(f"Błąd podczas pobierania danych: {e}")
+            if strict:
+                raise
+            return []
+
+    def get_offers_paginated(self, group_name, results_per_page=100, offset_token=None, keyword=None):
         """Pobiera paczkę ofert korzystając z iteratora stron (pager)."""
         table_name = f"Offers{group_name}"
-        client = TableClient.from_connection_string(self.connection_string, table_name=table_name)
+        client = self._get_client(table_name)
         
         try:
-            # 1. Tworzymy iterator stron
+            # 1. Tworzymy iterator stron (opcjonalnie tylko dla jednej frazy = jednej partycji)
             pager = client.query_entities(
-                query_filter="", 
+                query_filter="PartitionKey eq @keyword" if keyword else "",
+                parameters={"keyword": keyword} if keyword else None,
                 results_per_page=results_per_page
             ).by_page(continuation_token=offset_token)
             
@@ -0,0 +1,303 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.data.tables import TableClient, UpdateMode
+
+# --- KONFIGURACJA KOLEJKI ---
+LEASE_DURATION = timedelta(seconds=120) # "Visibility timeout" - po tym czasie zadanie wraca do puli
+MAX_TASK_ATTEMPTS = 3
+POLL_INTERVAL = 1.0                     # Jak często pusty worker sprawdza kolejkę (s)
+JOB_TTL = timedelta(hours=6)            # Porzucone zlecenia (np. przerwane żądanie) są potem usuwane
+SWEEP_INTERVAL = 600.0                  # Jak często worker w tle usuwa porzucone zlecenia (s)
+# Globalny budżet zapytań do Pracuj.pl (wszystkie instancje razem)
+RATE_PER_SECOND = float(os.getenv("SCRAPE_RATE_PER_SECOND", "1.0"))
+RATE_BURST = float(os.getenv("SCRAPE_RATE_BURST", "3"))
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def task_row_key(keyword, page):
+    # Deterministyczny klucz: ta sama fraza/strona w jednym zleceniu to zawsze jedno zadanie
+    return hashlib.md5(f"{keyword}|{page}".encode()).hexdigest()
+
+
+class SharedRateLimiter:
+    """
+    Token bucket przechowywany w Azure Table Storage, wspólny dla wszystkich instancji.
+    Współbieżne aktualizacje są rozstrzygane przez ETag (optimistic concurrency).
+    """
+
+    def __init__(self, connection_string, name="pracuj.pl", rate=RATE_PER_SECOND, burst=RATE_BURST):
+        self.client = TableClient.from_connection_string(connection_string, table_name="ScrapeRateBudget")
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        try:
+            self.client.create_table()
+        except ResourceExistsError:
+            pass
+
+    def try_acquire(self):
+        """Próbuje pobrać jeden token. Zwraca 0 przy sukcesie albo liczbę sekund do odczekania."""
+        now = _now()
+        try:
+            bucket = self.client.get_entity(partition_key="budget", row_key=self.name)
+        except ResourceNotFoundError:
+            try:
+                self.client.create_entity({"PartitionKey": "budget", "RowKey": self.name, "Tokens": self.burst - 1, "UpdatedAt": now})
+                return 0.0
+            except ResourceExistsError:
+                return 0.05 # Ktoś utworzył wiadro w tym samym momencie - spróbuj za chwilę
+
+        elapsed = max(0.0, (now - bucket["UpdatedAt"]).total_seconds())
+        tokens = min(self.burst, float(bucket["Tokens"]) + elapsed * self.rate)
+        if tokens < 1:
+            return (1 - tokens) / self.rate
+
+        bucket["Tokens"] = tokens - 1
+        bucket["UpdatedAt"] = now
+        try:
+            self.client.update_entity(
+                bucket, mode=UpdateMode.REPLACE,
+                etag=bucket.metadata["etag"], match_condition=MatchConditions.IfNotModified
+            )
+            return 0.0
+        except ResourceModifiedError:
+            return 0.01 # Inna instancja pobrała token równocześnie - ponów od razu
+
+    async def acquire(self):
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+class ScrapeTaskQueue:
+    """
+    Rozproszona kolejka zadań (fraza, strona) na Azure Table Storage.
+
+    Zadanie jest dzierżawione (lease) przez workera warunkową aktualizacją z ETagiem,
+    więc dwie instancje nie pobiorą tej samej strony. Jeśli worker padnie, dzierżawa
+    wygasa po LEASE_DURATION i zadanie przejmuje ktoś inny. Wyniki zapisywane są
+    upsertem z kluczem z linku, więc powtórne wykonanie zadania niczego nie dubluje.
+    """
+
+    def __init__(self, connection_string):
+        self.tasks = TableClient.from_connection_string(connection_string, table_name="ScrapeTasks")
+        self.results = TableClient.from_connection_string(connection_string, table_name="ScrapeResults")
+        for client in (self.tasks, self.results):
+            try:
+                client.create_table()
+            except ResourceExistsError:
+                pass
+
+    def enqueue_job(self, keywords, group_name, user_email, max_pages=1):
+        """Tworzy zlecenie (po jednym zadaniu na frazę i stronę). Zwraca job_id."""
+        job_id = uuid.uuid4().hex
+        operations = [
+            ("create", {
+                "PartitionKey": job_id,
+                "RowKey": task_row_key(keyword, page),
+                "Keyword": keyword,
+                "Page": page,
+                "Group": group_name,
+                "CreatedBy": user_email,
+                "Status": "pending",
+                "Attempts": 0,
+                "LeaseExpires": _now(),
+            })
+            for keyword in keywords for page in range(1, max_pages + 1)
+        ]
+        # Transakcja wsadowa obejmuje maks. 100 operacji w jednej partycji
+        for start in range(0, len(operations), 100):
+            self.tasks.submit_transaction(operations[start:start + 100])
+        return job_id
+
+    def lease(self, worker_id, job_id=None):
+        """Dzierżawi jedno wolne zadanie (opcjonalnie tylko z danego zlecenia) albo zwraca None."""
+        query = "(Status eq 'pending' or (Status eq 'leased' and LeaseExpires lt @now))"
+        parameters = {"now": _now()}
+        if job_id:
+            query = f"PartitionKey eq @job and {query}"
+            parameters["job"] = job_id
+        candidates = self.tasks.query_entities(query, parameters=parameters, results_per_page=10)
+
+        for task in candidates:
+            if task["Status"] == "leased" and task.get("Attempts", 0) >= MAX_TASK_ATTEMPTS:
+                # Dzierżawa wygasła po ostatniej próbie (worker padł przy tym zadaniu) - bez kolejnych ponowień
+                task["Status"] = "failed"
+                task["Error"] = task.get("Error") or "lease_expired"
+                try:
+                    self.tasks.update_entity(
+                        task, mode=UpdateMode.MERGE,
+                        etag=task.metadata["etag"], match_condition=MatchConditions.IfNotModified
+                    )
+                except (ResourceModifiedError, ResourceNotFoundError):
+                    pass
+                continue
+            task["Status"] = "leased"
+            task["LeaseOwner"] = worker_id
+            task["LeaseExpires"] = _now() + LEASE_DURATION
+            task["Attempts"] = task.get("Attempts", 0) + 1
+            try:
+                self.tasks.update_entity(
+                    task, mode=UpdateMode.MERGE,
+                    etag=task.metadata["etag"], match_condition=MatchConditions.IfNotModified
+                )
+            except ResourceModifiedError:
+                continue # Zadanie przejęła inna instancja - próbujemy następne
+            # Nowy ETag potrzebny do warunkowego zamknięcia zadania
+            return self.tasks.get_entity(task["PartitionKey"], task["RowKey"])
+        return None
+
+    def save_results(self, task, offers):
+        """Idempotentny zapis wyników zadania (klucz = hash linku)."""
+        for offer in offers:
+            self.results.upsert_entity({
+                "PartitionKey": task["PartitionKey"],
+                "RowKey": hashlib.md5(offer["Link"].encode()).hexdigest(),
+                **{key: value for key, value in offer.items() if value is not None},
+            }, mode=UpdateMode.REPLACE)
+
+    def complete(self, task, error=None):
+        """Zamyka zadanie. Błąd zwraca je do puli, dopóki nie wyczerpie prób."""
+        if error and task.get("Attempts", 0) < MAX_TASK_ATTEMPTS:
+            task["Status"] = "pending"
+        else:
+            task["Status"] = "failed" if error else "done"
+        task["Error"] = error or ""
+        task["LeaseExpires"] = _now()
+        try:
+            self.tasks.update_entity(
+                task, mode=UpdateMode.MERGE,
+                etag=task.metadata["etag"], match_condition=MatchConditions.IfNotModified
+            )
+        except (ResourceModifiedError, ResourceNotFoundError):
+            # Dzierżawa wygasła i zadanie przejął inny worker (jego wynik jest równoważny) albo zlecenie już usunięto
+            print(f"  Utracona dzierżawa zadania {task['Keyword']} (strona {task['Page']})")
+
+    def job_status(self, job_id, final=False):
+        """
+        Zwraca {"total", "done", "failed", "errors": [...]} dla zlecenia.
+
+        final: zlecenie zostanie zaraz usunięte (np. po limicie czasu) - niedokończone
+               zadania trafiają do "errors" jako "timeout", żeby fraza nie zniknęła bez śladu.
+        """
+        tasks = list(self.tasks.query_entities("PartitionKey eq @job", parameters={"job": job_id}))
+        # Jeden wpis na frazę, nawet jeśli nie udało się pobrać kilku jej stron
+        errors = {t["Keyword"]: t.get("Error") for t in tasks if t["Status"] == "failed"}
+        if final:
+            for t in tasks:
+                if t["Status"] not in ("done", "failed"):
+                    errors.setdefault(t["Keyword"], "timeout")
+        return {
+            "total": len(tasks),
+            "done": sum(1 for t in tasks if t["Status"] == "done"),
+            "failed": sum(1 for t in tasks if t["Status"] == "failed"),
+            "errors": [{"keyword": keyword, "error": error} for keyword, error in errors.items()],
+        }
+
+    def job_results(self, job_id):
+        results = self.results.query_entities("PartitionKey eq @job", parameters={"job": job_id})
+        return [{k: v for k, v in r.items() if k not in ("PartitionKey", "RowKey")} for r in results]
+
+    def delete_job(self, job_id):
+        """Usuwa zadania i wyniki zlecenia po odebraniu wyników - skanowanie kolejki nie rośnie z historią."""
+        for client in (self.tasks, self.results):
+            entities = client.query_entities("PartitionKey eq @job", parameters={"job": job_id}, select=["PartitionKey", "RowKey"])
+            self._delete_entities(client, entities)
+
+    def purge_expired(self, max_age=JOB_TTL):
+        """Usuwa zlecenia starsze niż max_age, których wyników nikt nie odebrał (np. przerwane żądania)."""
+        cutoff = {"cutoff": _now() - max_age}
+        deleted = 0
+        for client in (self.tasks, self.results):
+            entities = client.query_entities("Timestamp lt @cutoff", parameters=cutoff, select=["PartitionKey", "RowKey"])
+            deleted += self._delete_entities(client, entities)
+        return deleted
+
+    @staticmethod
+    def _delete_entities(client, entities):
+        partitions = {}
+        for entity in entities:
+            partitions.setdefault(entity["PartitionKey"], []).append(("delete", entity))
+        deleted = 0
+        for operations in partitions.values():
+            # Transakcja wsadowa obejmuje maks. 100 operacji w jednej partycji
+            for start in range(0, len(operations), 100):
+                try:
+                    client.submit_transaction(operations[start:start + 100])
+                    deleted += len(operations[start:start + 100])
+                except Exception as e:
+                    # Np. inna instancja usunęła część encji równocześnie - reszta przy kolejnym przebiegu
+                    print(f"Błąd usuwania zadań kolejki: {e}")
+        return deleted
+
+
+class ScrapeWorker:
+    """Pętla workera: dzierżawa zadania -> token z globalnego budżetu -> pobranie -> zapis wyników."""
+
+    def __init__(self, queue, rate_limiter, scraper, storage_manager, worker_id=None):
+        self.queue = queue
+        self.rate_limiter = rate_limiter
+        self.scraper = scraper
+        self.storage_manager = storage_manager
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    async def run_once(self, client, job_id=None):
+        """Wykonuje jedno zadanie. Zwraca False, jeśli kolejka była pusta."""
+        task = await asyncio.to_thread(self.queue.lease, self.worker_id, job_id)
+        if task is None:
+            return False
+
+        # Token z globalnego budżetu pobierany przed każdą próbą - ponowienia też się w nim mieszczą
+        offers, error = await self.scraper.fetch_page(
+            client, task["Keyword"], task["Page"], before_attempt=self.rate_limiter.acquire
+        )
+
+        error = error["error"] if error else None
+        if not error:
+            try:
+                await asyncio.to_thread(self.queue.save_results, task, offers)
+                await asyncio.to_thread(self.storage_manager.save_offers, offers, task["Group"], task["CreatedBy"])
+            except Exception as e:
+                # Błąd zapisu zwraca zadanie do puli od razu, zamiast czekać na koniec dzierżawy
+                print(f"Błąd zapisu wyników zadania {task['Keyword']} (strona {task['Page']}): {e}")
+                error = f"save: {e}"
+        await asyncio.to_thread(self.queue.complete, task, error)
+        return True
+
+    async def run_forever(self, client, stop_event=None):
+        next_sweep = time.monotonic()
+        while not (stop_event and stop_event.is_set()):
+            try:
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + SWEEP_INTERVAL
+                    await asyncio.to_thread(self.queue.purge_expired)
+                worked = await self.run_once(client)
+            except Exception as e:
+                print(f"Błąd workera {self.worker_id}: {e}")
+                worked = False
+            if not worked:
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def run_job(self, client, job_id, timeout=300):
+        """Pomaga wykonać konkretne zlecenie i czeka, aż wszystkie jego zadania się zakończą."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not await self.run_once(client, job_id):
+                status = await asyncio.to_thread(self.queue.job_status, job_id)
+                if status["done"] + status["failed"] >= status["total"]:
+                    return status
+                # Pozostałe zadania są dzierżawione przez inne instancje
+                await asyncio.sleep(POLL_INTERVAL)
+        return await asyncio.to_thread(self.queue.job_status, job_id, True)
@@ -0,0 +1,147 @@
+import asyncio
+import threading
+
+from fair_scheduler import FairScheduler
+
+
+async def settle():
+    # Kilka obrotów pętli - zadania zdążą się zgłosić albo odebrać przydział
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def take(scheduler, group, user, order, tag):
+    await scheduler.acquire(group, user)
+    order.append(tag)
+
+
+def test_single_keyword_is_not_starved_by_twenty():
+    async def scenario():
+        scheduler = FairScheduler(capacity=1)
+        await scheduler.acquire("HR", "alice")
+        order = []
+        tasks = [asyncio.create_task(take(scheduler, "HR", "alice", order, f"alice-{i}")) for i in range(20)]
+        await settle()
+        tasks.append(asyncio.create_task(take(scheduler, "HR", "bob", order, "bob")))
+        await settle()
+
+        # Każde zwolnienie przydziela jedno miejsce - zwalniamy, aż wszyscy dostaną swoje
+        for _ in range(21):
+            scheduler.release("HR")
+            await settle()
+        await asyncio.gather(*tasks)
+        scheduler.release("HR")
+        return order, scheduler
+
+    order, scheduler = asyncio.run(scenario())
+    assert order.index("bob") <= 1
+    assert scheduler.in_use == 0
+
+
+def test_groups_share_capacity_by_weight():
+    async def scenario(weights):
+        scheduler = FairScheduler(capacity=1, group_weights=weights)
+        await scheduler.acquire("HR", "hold")
+        order = []
+        tasks = [
+            asyncio.create_task(take(scheduler, group, "user", order, group))
+            for _ in range(12) for group in ("HR", "Sales")
+        ]
+        await settle()
+        for _ in range(len(tasks)):
+            scheduler.release(order[-1] if order else "HR")
+            await settle()
+        await asyncio.gather(*tasks)
+        return order[:9]
+
+    assert sorted(asyncio.run(scenario({}))[:8]) == ["HR"] * 4 + ["Sales"] * 4
+    # Dział z wagą 2 dostaje dwa razy więcej miejsc
+    assert asyncio.run(scenario({"HR": 2.0})).count("HR") == 6
+
+
+def test_group_quota_caps_running_keywords():
+    async def scenario():
+        scheduler = FairScheduler(capacity=3, group_quotas={"Sales": 1})
+        order = []
+        sales = [asyncio.create_task(take(scheduler, "Sales", "carol", order, "Sales")) for _ in range(4)]
+        await settle()
+        assert order == ["Sales"] and scheduler.in_use == 1
+
+        # Wolne miejsca ponad kwotę Sales dostają inne działy
+        hr = [asyncio.create_task(take(scheduler, "HR", "bob", order, "HR")) for _ in range(2)]
+        await settle()
+        assert order.count("HR") == 2 and scheduler.in_use == 3
+        assert scheduler.snapshot()["groups"]["Sales"]["waiting"] == 3
+
+        for _ in hr:
+            scheduler.release("HR")
+        await settle()
+        assert order.count("Sales") == 1 # Nadal tylko jedna fraza Sales naraz
+
+        for task in sales:
+            task.cancel()
+        await asyncio.gather(*sales, return_exceptions=True)
+        scheduler.release("Sales")
+        return scheduler
+
+    assert asyncio.run(scenario()).in_use == 0
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def scenario():
+        scheduler = FairScheduler(capacity=1)
+        await scheduler.acquire("A", "x")
+        waiter = asyncio.create_task(scheduler.acquire("B", "y"))
+        await settle()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler.snapshot()["groups"].get("B") is None
+
+        scheduler.release("A")
+        return scheduler
+
+    assert asyncio.run(scenario()).in_use == 0
+
+
+def test_cancel_after_grant_returns_slot():
+    async def scenario():
+        scheduler = FairScheduler(capacity=1)
+        await scheduler.acquire("A", "x")
+        waiter = asyncio.create_task(scheduler.acquire("B", "y"))
+        await settle()
+        # Miejsce przydzielone, ale czekający anulowany, zanim się obudził
+        scheduler.release("A")
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert scheduler.in_use == 0
+    assert scheduler.running == {"A": 0, "B": 0}
+
+
+def test_slot_released_in_another_event_loop_wakes_waiter():
+    scheduler = FairScheduler(capacity=1)
+    acquired = threading.Event()
+    release = threading.Event()
+
+    async def holder():
+        async with scheduler.slot("HR", "alice"):
+            acquired.set()
+            await asyncio.to_thread(release.wait)
+
+    thread = threading.Thread(target=asyncio.run, args=(holder(),))
+    thread.start()
+    acquired.wait(timeout=5)
+
+    async def waiter():
+        task = asyncio.create_task(scheduler.acquire("Sales", "bob"))
+        await settle()
+        assert not task.done()
+        release.set()
+        await asyncio.wait_for(task, timeout=5)
+        scheduler.release("Sales")
+
+    asyncio.run(waiter())
+    thread.join(timeout=5)
+    assert scheduler.in_use == 0
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+
+import retry_policy
+from retry_policy import CircuitBreaker, RetryPolicy, fetch_with_retry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+class FakePool:
+    """Zamiast FETCH_POOL: zwraca kolejne kody HTTP albo czeka bez końca (status None)."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    async def get(self, client, url, **kwargs):
+        self.calls += 1
+        status = self.statuses.pop(0)
+        if status is None:
+            await asyncio.Event().wait()
+        return FakeResponse(status)
+
+    def cooldown_remaining(self):
+        return 0.0
+
+
+def open_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=3, window=10.0, open_duration=30.0, clock=clock)
+    for _ in range(3):
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold_within_window():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, window=10.0, open_duration=30.0, clock=clock)
+    breaker.record_failure()
+    clock.now = 11.0 # Pierwsza awaria wypada z okna
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.retry_in() == 30.0
+
+
+def test_half_open_allows_single_probe():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 30.0
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow() # Drugie zapytanie czeka na wynik próby
+
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_probe_reopens():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 30.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.now = 60.0
+    assert breaker.allow()
+
+
+def test_concurrent_threads_get_one_probe():
+    clock = FakeClock()
+    breaker = open_breaker(clock)
+    clock.now = 30.0
+    barrier = threading.Barrier(16)
+    allowed = []
+
+    def probe():
+        barrier.wait()
+        allowed.append(breaker.allow())
+
+    threads = [threading.Thread(target=probe) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert allowed.count(True) == 1
+
+
+def test_cancelled_probe_is_released():
+    url = "https://probe.test/oferta"
+    clock = FakeClock()
+    retry_policy.BREAKERS["probe.test"] = breaker = open_breaker(clock)
+    clock.now = 30.0
+    try:
+        async def scenario():
+            task = asyncio.create_task(fetch_with_retry(None, url, fetch_pool=FakePool([None])))
+            for _ in range(5):
+                await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(scenario())
+        assert breaker.state == "half_open" and not breaker.probe_in_flight
+        assert breaker.allow() # Następne zapytanie może wysłać nową próbę
+    finally:
+        retry_policy.BREAKERS.pop("probe.test", None)
+
+
+def test_retries_charge_before_attempt_hook():
+    url = "https://hook.test/oferta"
+    charged = []
+
+    async def charge():
+        charged.append(1)
+
+    try:
+        pool = FakePool([503, 503, 200])
+        policy = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0)
+        outcome = asyncio.run(fetch_with_retry(None, url, policy=policy, fetch_pool=pool, before_attempt=charge))
+        assert outcome["ok"] and outcome["attempts"] == 3
+        assert len(charged) == pool.calls == 3
+    finally:
+        retry_policy.BREAKERS.pop("hook.test", None)
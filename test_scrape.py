@@ -20,7 +20,9 @@ async def main():
         results = await asyncio.gather(*tasks)
         
         for r in results:
-            all_results.extend(r)
+            all_results.extend(r['results'])
+            for error in r['errors']:
+                print(f"Błąd dla [{r['keyword']}]: {error['error']} (próby: {error.get('attempts')})")
 
     # 3. Wyświetlenie wyników
     print(f"Test zakończony. Znaleziono łącznie: {len(all_results)} ofert.")
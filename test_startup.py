@@ -0,0 +1,66 @@
+import os
+import re
+import subprocess
+import sys
+
+# --- BUDŻET STARTU ---
+# Łączny czas importu app.py (ms) - przekroczenie oznacza regres zimnego startu
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "500"))
+# Biblioteki, które mają być importowane dopiero przy pierwszym użyciu (lub w /warmup)
+LAZY_MODULES = ["curl_cffi", "bs4", "pandas", "numpy", "azure.data.tables", "scraper", "storage", "task_queue"]
+
+# Konfiguracja potrzebna do importu app.py (nic nie łączy się z Azure przy starcie)
+TEST_ENV = {
+    "AZURE_STORAGE_CONNECTION_STRING": (
+        "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+        "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+        "TableEndpoint=http://127.0.0.1:10002/devstoreaccount1;"
+    ),
+    "FLASK_SECRET_KEY": "test",
+    "SCRAPE_QUEUE_ENABLED": "0",
+}
+
+
+def import_profile():
+    """
+    Importuje app.py w osobnym procesie z -X importtime.
+
+    Returns:
+        dict: { moduł: (czas własny µs, czas łączny µs) }
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, **TEST_ENV},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    profile = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)", line)
+        if match:
+            profile[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return profile
+
+
+def test_import_time_budget():
+    # Najlepszy z kilku pomiarów - odporny na chwilowe obciążenie maszyny
+    total_ms = min(import_profile()["app"][1] for _ in range(3)) / 1000
+    assert total_ms <= IMPORT_BUDGET_MS, f"Import app.py trwa {total_ms:.0f} ms (budżet: {IMPORT_BUDGET_MS:.0f} ms)"
+
+
+def test_heavy_modules_are_lazy():
+    profile = import_profile()
+    eager = [name for name in LAZY_MODULES if name in profile]
+    assert not eager, f"Moduły importowane przy starcie zamiast leniwie: {eager}"
+
+
+if __name__ == "__main__":
+    # Raport: najwolniejsze importy przy starcie aplikacji
+    profile = import_profile()
+    print(f"Import app.py: {profile['app'][1] / 1000:.0f} ms (budżet: {IMPORT_BUDGET_MS:.0f} ms)\n")
+    print("--- 15 NAJWOLNIEJSZYCH MODUŁÓW (czas łączny) ---")
+    for name, (own, cumulative) in sorted(profile.items(), key=lambda item: -item[1][1])[:15]:
+        print(f"{cumulative / 1000:8.1f} ms  {name}")
@@ -0,0 +1,59 @@
+import asyncio
+
+# --- KONFIGURACJA POTOKU ZAPISU ---
+MAX_QUEUED_BATCHES = 8 # Ile paczek (stron wyników) może czekać na zapis - powyżej scrapery czekają
+WRITERS = 2            # Liczba równoległych zadań zapisujących
+
+
+class OfferWritePipeline:
+    """
+    Potok: scrapery -> ograniczona kolejka -> równoległe zadania zapisu do Azure (każde w wątku).
+
+    Oferty są zapisywane w trakcie pobierania kolejnych fraz, więc czas całego
+    żądania zbliża się do max(scrapowanie, zapis) zamiast ich sumy. Pełna kolejka
+    wstrzymuje scrapery (backpressure), więc w pamięci czeka najwyżej
+    MAX_QUEUED_BATCHES paczek niezależnie od liczby fraz.
+
+    Użycie:
+        async with OfferWritePipeline(storage_manager, group, email) as pipeline:
+            await scraper.scrape_keyword(client, keyword, sink=pipeline.put)
+    """
+
+    def __init__(self, storage_manager, group_name, user_email, max_queued_batches=MAX_QUEUED_BATCHES, writers=WRITERS):
+        self.storage_manager = storage_manager
+        self.group_name = group_name
+        self.user_email = user_email
+        self.writers = writers
+        self.queue = asyncio.Queue(maxsize=max_queued_batches)
+        self.errors = []
+        self.saved = 0
+        self._tasks = []
+
+    async def __aenter__(self):
+        self._tasks = [asyncio.create_task(self._writer()) for _ in range(self.writers)]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # Sygnał końca dla każdego zadania zapisu - najpierw dopisują to, co zostało w kolejce
+        for _ in self._tasks:
+            await self.queue.put(None)
+        await asyncio.gather(*self._tasks)
+        return False
+
+    async def put(self, offers):
+        """Dodaje paczkę ofert do zapisu; czeka, jeśli kolejka jest pełna."""
+        if offers:
+            await self.queue.put(offers)
+
+    async def _writer(self):
+        while True:
+            offers = await self.queue.get()
+            if offers is None:
+                return
+            try:
+                await self.storage_manager.save_offers_async(offers, self.group_name, self.user_email)
+                self.saved += len(offers)
+            except Exception as e:
+                # Błąd zapisu jednej paczki nie przerywa scrapowania pozostałych fraz
+                print(f"Błąd zapisu do Azure Table Storage: {e}")
+                self.errors.append(str(e))